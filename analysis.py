@@ -0,0 +1,217 @@
+import os
+import json
+import argparse
+import matplotlib
+# no display needed: figures are only written to files
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import event_io
+import multi_scale
+import statistics
+from order import OrderEvent
+
+
+class RunData:
+	"""
+	The saved data of a run, written by Exchange.run_dump, with the attributes of Exchange
+	that statistics.py reads, so the stylized facts can be computed without re-running the simulation.
+	"""
+
+	def __init__(self, directory):
+		with np.load(os.path.join(directory, "series.npz")) as series:
+			self.init_price = float(series["init_price"])
+			self.prices = series["prices"]
+			self.mid_prices = series["mid_prices"]
+			self.all_deal_prices = series["all_deal_prices"]
+			self.orders_signs = series["orders_signs"]
+		self.tape = self.load_event_log(directory, "tape")
+		self.all_orders_for_record = self.load_event_log(directory, "orders", OrderEvent)
+		self.exception_transaction = self.load_event_log(directory, "exceptions")
+		self.mid_quotes = self.load_event_log(directory, "mid_quotes")
+		self.trade_prices_with_time = self.load_event_log(directory, "trade_prices")
+
+	@staticmethod
+	def load_event_log(directory, name, record=None):
+		for file_name in [name + ".npz", name, name + ".parquet"]:
+			path = os.path.join(directory, file_name)
+			if os.path.exists(path):
+				return event_io.load_event_log(path, record=record)
+		return None
+
+
+def usable_scales(time_scales, length):
+	"""
+	time scales which leave at least a few returns in a series of this length
+	"""
+	return [time_scale for time_scale in time_scales if time_scale < length - 2]
+
+
+def compute_facts(run, processes=None):
+	"""
+	Compute the stylized facts of a run.
+	:param run: the instance of RunData, or a finished Exchange
+	:param processes: worker processes for the multi-scale statistics, see multi_scale.map_scales
+	:return: summary dict (JSON serializable), and list of figures for render_figure
+	"""
+	summary = dict()
+	figures = []
+
+	# price trend
+	prices = np.asarray(run.prices, dtype=np.float64)
+	trade_price_rolling_mean = pd.Series(prices).ewm(span=2000).mean().to_numpy()
+	summary["periods"] = len(prices)
+	summary["trades"] = len(run.all_deal_prices)
+	summary["price"] = {
+		"first": float(prices[0]),
+		"last": float(prices[-1]),
+		"min": float(prices.min()),
+		"max": float(prices.max())}
+	figures.append({
+		"name": "price trend",
+		"x": np.arange(len(prices)),
+		"y": trade_price_rolling_mean,
+		"xlabel": "Period",
+		"ylabel": "Price",
+		"title": "Price Trend"})
+
+	# long memory in order flow
+	summary["order_flow"] = statistics.long_memory_in_order_flow(run)
+
+	# price spikes
+	spikes = statistics.find_price_spike(run)
+	summary["price_spikes"] = {
+		"count": len(spikes["first_tick"]),
+		"mean_magnitude": float(np.mean(np.abs(spikes["magnitude"]))) if len(spikes["magnitude"]) else None,
+		"mean_duration": float(np.mean(spikes["duration"])) if len(spikes["duration"]) else None}
+
+	# concave price impact
+	price_impact_bins = statistics.PriceImpactBins()
+	price_impact_bins.add_exchange(run)
+	impact = price_impact_bins.result()
+	filled = impact["count"] > 0
+	summary["price_impact"] = {
+		"lower": impact["lower"][filled].tolist(),
+		"upper": impact["upper"][filled].tolist(),
+		"mean": impact["mean"][filled].tolist(),
+		"count": impact["count"][filled].tolist(),
+		"standard_error": impact["standard_error"][filled].tolist()}
+	figures.append({
+		"name": "concave price impact",
+		"x": np.sqrt(impact["lower"] * impact["upper"])[filled],
+		"y": impact["mean"][filled],
+		"yerr": impact["standard_error"][filled],
+		"xscale": "log",
+		"xlabel": "Trade size",
+		"ylabel": "Price impact"})
+
+	# volatility clustering
+	mid_quotes = run.mid_quotes.column("mid_quote")
+	time_scales = usable_scales(range(1, 2000, 10), len(mid_quotes))
+	clustering = multi_scale.map_scales(statistics.returns_volatility_clustering, mid_quotes, time_scales, processes)
+	summary["volatility_clustering"] = {"time_scales": time_scales, "value": [float(value) for value in clustering]}
+	figures.append({
+		"name": "volatility clustering",
+		"x": time_scales,
+		"y": clustering,
+		"xlabel": "Time-scale",
+		"ylabel": "% Volatility clustering"})
+
+	# fat tails
+	time_scales = usable_scales(range(500, 50000, 500), len(run.mid_prices))
+	kurtosis_multi_scales = multi_scale.map_scales(statistics.returns_kurtosis, run.mid_prices, time_scales, processes)
+	summary["fat_tails"] = {"time_scales": time_scales, "kurtosis": [float(value) for value in kurtosis_multi_scales]}
+	figures.append({
+		"name": "fat-tailed distribution",
+		"x": time_scales,
+		"y": kurtosis_multi_scales,
+		"xlabel": "Time-scale",
+		"ylabel": "Kurtosis"})
+	figures.append({
+		"name": "mid-price",
+		"x": np.arange(len(run.mid_prices)),
+		"y": pd.Series(run.mid_prices).ewm(span=2000).mean().to_numpy(),
+		"xlabel": "Period",
+		"ylabel": "Mid-price"})
+
+	# return auto-correlation
+	time_scales = usable_scales(range(1, 10), len(run.mid_prices))
+	mid_price_acfs = multi_scale.map_scales(statistics.returns_auto_correlation, run.mid_prices, time_scales, processes)
+	trade_prices = pd.Series(prices).ewm(span=4).mean().to_numpy()
+	trade_price_acfs = multi_scale.map_scales(statistics.returns_auto_correlation, trade_prices, time_scales, processes)
+	summary["return_auto_correlation"] = {
+		"time_scales": time_scales,
+		"mid_price": [acfs.tolist() for acfs in mid_price_acfs],
+		"trade_price": [acfs.tolist() for acfs in trade_price_acfs]}
+	return summary, figures
+
+
+def without_nan(value):
+	"""
+	replace NaN floats in a summary by None, as JSON has no NaN
+	"""
+	if isinstance(value, dict):
+		return {key: without_nan(item) for key, item in value.items()}
+	if isinstance(value, list):
+		return [without_nan(item) for item in value]
+	if isinstance(value, float) and value != value:
+		return None
+	return value
+
+
+def render_figure(figure, figure_dir):
+	"""
+	Draw one figure of compute_facts into figure_dir, run in a worker process
+	:return: path of the written file
+	"""
+	plt.figure(figsize=(8, 4))
+	if "yerr" in figure:
+		plt.errorbar(figure["x"], figure["y"], yerr=figure["yerr"])
+	else:
+		plt.plot(figure["x"], figure["y"])
+	if "xscale" in figure:
+		plt.xscale(figure["xscale"])
+	if "title" in figure:
+		plt.title(figure["title"])
+	plt.xlabel(figure["xlabel"])
+	plt.ylabel(figure["ylabel"])
+	path = os.path.join(figure_dir, figure["name"] + ".png")
+	plt.savefig(path, dpi=400, bbox_inches="tight")
+	plt.close()
+	return path
+
+
+def analyse(run_dir, output_dir, processes=None):
+	"""
+	Compute the stylized facts of a saved run, write summary.json and render the figures in parallel
+	:param run_dir: directory written by Exchange.run_dump
+	:param output_dir: directory for summary.json and the figures
+	:param processes: worker processes, all cpus if None
+	:return: the summary dict
+	"""
+	run = RunData(run_dir)
+	summary, figures = compute_facts(run, processes)
+	if not os.path.exists(output_dir):
+		os.makedirs(output_dir)
+	workers = processes or os.cpu_count() or 1
+	with ProcessPoolExecutor(max_workers=min(workers, len(figures))) as executor:
+		paths = list(executor.map(render_figure, figures, [output_dir] * len(figures)))
+	summary["figures"] = paths
+	with open(os.path.join(output_dir, "summary.json"), "w") as summary_file:
+		json.dump(without_nan(summary), summary_file, indent=2)
+	return summary
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Stylized facts of a saved run, see Exchange.run_dump")
+	parser.add_argument("run_dir", nargs="?", default=os.path.join("data", "run"))
+	parser.add_argument("--output", default=os.path.join("figures", "analysis"))
+	parser.add_argument("--processes", type=int, default=None)
+	args = parser.parse_args()
+	analyse(args.run_dir, args.output, args.processes)
+
+
+if __name__ == "__main__":
+	main()
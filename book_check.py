@@ -0,0 +1,184 @@
+import sys
+import argparse
+import numpy as np
+from exchange import Exchange
+from order import Order
+import main
+
+# trade count, price range, last price and traded volume of main.run_simulation(20000, seed=1)
+REGRESSION_RUN = {
+	"total_time": 20000,
+	"seed": 1,
+	"trades": 1067,
+	"min_price": 99.86,
+	"max_price": 100.53,
+	"last_price": 100.06,
+	"volume": 960782}
+
+
+class ReferenceBook:
+	"""
+	The matching rules of Exchange written plainly, on lists of resting orders:
+	price priority, then time priority by quote i.d., and fills at the price of the resting order.
+	"""
+
+	def __init__(self):
+		self.bids = []
+		self.asks = []
+		self.quote_id = 0
+
+	def side(self, order_type):
+		return self.bids if order_type == "Bid" else self.asks
+
+	def process_order(self, order_type, trader_id, price, quantity):
+		"""
+		:return: list of fills, each (price, quantity, ask trader_id, bid trader_id)
+		"""
+		quote_id = self.quote_id
+		self.quote_id += 1
+		if order_type == "Bid":
+			crossing = sorted((item for item in self.asks if item[2] <= price), key=lambda item: (item[2], item[0]))
+		else:
+			crossing = sorted((item for item in self.bids if item[2] >= price), key=lambda item: (-item[2], item[0]))
+		fills = []
+		for item in crossing:
+			if quantity == 0:
+				break
+			fill_quantity = min(item[3], quantity)
+			item[3] -= fill_quantity
+			quantity -= fill_quantity
+			if order_type == "Bid":
+				fills.append((item[2], fill_quantity, item[1], trader_id))
+			else:
+				fills.append((item[2], fill_quantity, trader_id, item[1]))
+		self.bids = [item for item in self.bids if item[3] > 0]
+		self.asks = [item for item in self.asks if item[3] > 0]
+		if quantity > 0:
+			self.side(order_type).append([quote_id, trader_id, price, quantity])
+		return fills
+
+	def cancel_all(self, trader_id, order_type):
+		if order_type == "Bid":
+			self.bids = [item for item in self.bids if item[1] != trader_id]
+		else:
+			self.asks = [item for item in self.asks if item[1] != trader_id]
+
+	def cancel_oldest(self, trader_id, order_type):
+		own = [item for item in self.side(order_type) if item[1] == trader_id]
+		if own:
+			self.side(order_type).remove(min(own, key=lambda item: item[0]))
+
+	def reduce(self, quote_id, quantity):
+		for book in (self.bids, self.asks):
+			for item in book:
+				if item[0] == quote_id:
+					if quantity >= item[3]:
+						book.remove(item)
+					else:
+						item[3] -= quantity
+					return
+
+	def anonymized(self, order_type):
+		levels = dict()
+		for item in self.side(order_type):
+			levels[item[2]] = levels.get(item[2], 0) + item[3]
+		return [[price, levels[price]] for price in sorted(levels)]
+
+
+def book_problems(exchange, reference):
+	"""
+	:return: list of the broken invariants of the exchange's book, and of its differences from the reference
+	"""
+	problems = ["bids: " + problem for problem in exchange.bids.check_invariants()]
+	problems += ["asks: " + problem for problem in exchange.asks.check_invariants()]
+	best_bid = exchange.bids.best_price
+	best_ask = exchange.asks.best_price
+	if best_bid is not None and best_ask is not None and best_bid >= best_ask:
+		problems.append("book is crossed, {} >= {}".format(best_bid, best_ask))
+	if exchange.bids.lob_anon != reference.anonymized("Bid"):
+		problems.append("bids differ from the reference")
+	if exchange.asks.lob_anon != reference.anonymized("Ask"):
+		problems.append("asks differ from the reference")
+	return problems
+
+
+def check_random_operations(operations=20000, seed=0, traders=20):
+	"""
+	Drive an Exchange and the ReferenceBook with the same random orders, cancels and reductions,
+	and check the trades, the book invariants and the anonymized books after every operation.
+	:param operations: number of operations
+	:param seed: seed of the operations
+	:param traders: number of trader ids the orders are spread over
+	:return: list of the problems found, with the operation they appeared after
+	"""
+	generator = np.random.default_rng(seed)
+	exchange = Exchange()
+	reference = ReferenceBook()
+	problems = []
+	for cur_time in range(operations):
+		trader_id = "trader {}".format(generator.integers(traders))
+		order_type = "Bid" if generator.random() < 0.5 else "Ask"
+		action = generator.random()
+		if action < 0.7:
+			# limit prices on a narrow grid, so that orders often cross and share levels
+			price = round(99.9 + 0.01 * int(generator.integers(21)), 2)
+			quantity = int(generator.integers(1, 51))
+			order = Order(trader_id=trader_id, order_type=order_type, price=price, quantity=quantity, time=cur_time)
+			trades = exchange.process_order(cur_time, order)
+			got = [(trade["price"], trade["quantity"], trade["ask"], trade["bid"]) for trade in trades]
+			expected = reference.process_order(order_type, trader_id, price, quantity)
+			if got != expected:
+				problems.append("{}: trades {} differ from {}".format(cur_time, got, expected))
+		elif action < 0.8:
+			exchange.del_trader_all_orders(trader_id, [order_type], cur_time)
+			reference.cancel_all(trader_id, order_type)
+		elif action < 0.9:
+			exchange.del_oldest_order(trader_id, order_type, cur_time)
+			reference.cancel_oldest(trader_id, order_type)
+		elif exchange.quote_id > 0:
+			quote_id = int(generator.integers(exchange.quote_id))
+			quantity = int(generator.integers(1, 51))
+			exchange.reduce_order(quote_id, quantity, cur_time)
+			reference.reduce(quote_id, quantity)
+		problems += ["{}: {}".format(cur_time, problem) for problem in book_problems(exchange, reference)]
+		if problems:
+			break
+	return problems
+
+
+def check_regression_run(expected=None):
+	"""
+	Run the seeded day of REGRESSION_RUN and compare its trade count and prices,
+	which changes to the matching engine or to the agents' rules would move.
+	:return: list of the values which differ
+	"""
+	if expected is None:
+		expected = REGRESSION_RUN
+	exchange, agents, mm_order = main.run_simulation(expected["total_time"], expected["seed"], verbose=False)
+	prices = np.asarray(exchange.all_deal_prices, dtype=np.float64)
+	volume = sum(record["quantity"] for record in exchange.tape if record["type"] == "Trade")
+	found = {
+		"trades": len(prices),
+		"min_price": round(float(prices.min()), 2),
+		"max_price": round(float(prices.max()), 2),
+		"last_price": round(float(prices[-1]), 2),
+		"volume": int(volume)}
+	return ["{} is {}, {} expected".format(key, value, expected[key]) for key, value in found.items() if value != expected[key]]
+
+
+def main_check():
+	parser = argparse.ArgumentParser(description="Check the order book against a reference matcher and a seeded run")
+	parser.add_argument("--operations", type=int, default=20000)
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+	problems = check_random_operations(args.operations, args.seed)
+	problems += check_regression_run()
+	for problem in problems:
+		print(problem)
+	if problems:
+		sys.exit("[Error] order book check failed")
+	print("order book check passed")
+
+
+if __name__ == "__main__":
+	main_check()
@@ -0,0 +1,251 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+import itertools
+import numpy as np
+from scipy.stats import kurtosis
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import main
+import ensemble
+import multi_scale
+import statistics
+from ring_series import held_values
+
+# stylized facts a calibrated run should reproduce, and the spread that counts as one unit of error:
+# fat tailed returns, a slowly (power law) decaying order sign auto-correlation, and long memory of the order flow
+DEFAULT_TARGETS = {
+	"kurtosis": (10.0, 10.0),
+	"acf_decay": (0.5, 0.25),
+	"hurst": (0.7, 0.1)}
+
+
+def grid(space):
+	"""
+	every combination of the listed parameter values
+	:param space: dict of "agent.attribute" -> list of values
+	:return: list of parameter dicts
+	"""
+	keys = sorted(space)
+	return [dict(zip(keys, values)) for values in itertools.product(*[space[key] for key in keys])]
+
+
+def random_search(space, samples, seed=None):
+	"""
+	parameter dicts drawn at random from a search space
+	:param space: dict of "agent.attribute" -> (low, high) for a uniform draw, or list of values to choose from
+	:param samples: number of parameter dicts
+	:param seed: seed of the draws
+	:return: list of parameter dicts
+	"""
+	generator = np.random.default_rng(seed)
+	points = []
+	for _ in range(samples):
+		point = dict()
+		for key in sorted(space):
+			values = space[key]
+			if isinstance(values, tuple):
+				point[key] = float(generator.uniform(values[0], values[1]))
+			else:
+				point[key] = values[int(generator.integers(len(values)))]
+		points.append(point)
+	return points
+
+
+def point_key(params, seed, total_time):
+	"""
+	:return: sha256 hex digest identifying a simulation, the name of its cache entry
+	"""
+	text = json.dumps({"params": params, "seed": seed, "total_time": total_time}, sort_keys=True)
+	return hashlib.sha256(text.encode()).hexdigest()
+
+
+class ResultCache:
+	"""
+	Results of finished simulations, one JSON file per point_key, so an interrupted
+	or repeated sweep only runs the missing points.
+	"""
+
+	def __init__(self, directory):
+		self.directory = directory
+		if not os.path.exists(directory):
+			os.makedirs(directory)
+
+	def path(self, key):
+		return os.path.join(self.directory, key + ".json")
+
+	def get(self, key):
+		"""
+		:return: the cached result, or None
+		"""
+		path = self.path(key)
+		if not os.path.exists(path):
+			return None
+		with open(path) as cache_file:
+			return json.load(cache_file)
+
+	def put(self, key, result):
+		# write then rename, so an interruption never leaves a partial entry
+		path = self.path(key)
+		with open(path + ".tmp", "w") as cache_file:
+			json.dump(result, cache_file)
+		os.replace(path + ".tmp", path)
+
+
+def acf_decay(orders_signs, lags=50):
+	"""
+	exponent gamma of a power law fit, acf(k) ~ k ** -gamma, to the order sign auto-correlation
+	"""
+	acfs = statistics.auto_correlation(orders_signs, min(lags, len(orders_signs) - 2), absolute=False)
+	positive = np.flatnonzero(acfs > 0)
+	if len(positive) < 2:
+		return np.nan
+	return -np.polyfit(np.log(positive + 1), np.log(acfs[positive]), 1)[0]
+
+
+def run_facts(exchange, time_scale=10):
+	"""
+	the stylized facts of a finished run which are scored by calibration
+	:param time_scale: horizon of the mid-price returns for the kurtosis
+	:return: dict of fact name -> value
+	"""
+	orders_signs = held_values(exchange.orders_signs)[1]
+	returns = multi_scale.scale_returns(multi_scale.log_prices(held_values(exchange.mid_prices)[1]), time_scale)
+	return {
+		"kurtosis": float(kurtosis(returns)),
+		"acf_decay": float(acf_decay(orders_signs)),
+		"hurst": float(statistics.hurst(orders_signs))}
+
+
+def score(facts, targets=None):
+	"""
+	sum of squared distances of the facts to their targets, in units of the target spreads; lower is better
+	"""
+	if targets is None:
+		targets = DEFAULT_TARGETS
+	total = 0.0
+	for name, (target, spread) in targets.items():
+		value = facts[name]
+		if value != value:
+			return float("inf")
+		total += ((value - target) / spread) ** 2
+	return total
+
+
+def evaluate(params, seed, total_time, targets=None):
+	"""
+	Simulate one point of a sweep and score it, run in a worker process.
+	:return: dict of params, seed, total_time, facts and score
+	"""
+	exchange, traders, mm_order = main.run_simulation(total_time, seed, verbose=False, params=params)
+	facts = run_facts(exchange)
+	return {"params": params, "seed": seed, "total_time": total_time, "facts": facts, "score": score(facts, targets)}
+
+
+def sweep(points, seeds, total_time, cache_dir, processes=None, targets=None):
+	"""
+	Simulate every parameter dict with every seed over a process pool, reusing cached results.
+	Each result is cached as soon as its simulation finishes.
+	:param points: list of parameter dicts, see grid and random_search
+	:param seeds: list of seeds, each point is run once per seed
+	:param total_time: number of periods of each simulation
+	:param cache_dir: directory of the ResultCache
+	:param processes: worker processes, all cpus if None
+	:param targets: dict of fact name -> (target, spread), DEFAULT_TARGETS if None
+	:return: list of results, see evaluate, in point and seed order
+	"""
+	cache = ResultCache(cache_dir)
+	keys = []
+	results = dict()
+	for params in points:
+		for seed in seeds:
+			key = point_key(params, seed, total_time)
+			keys.append((key, params, seed))
+			cached = cache.get(key)
+			if cached is not None:
+				# the score follows the targets of this sweep, the facts do not depend on them
+				cached["score"] = score(cached["facts"], targets)
+				results[key] = cached
+	missing = [(key, params, seed) for key, params, seed in keys if key not in results]
+	print("points: {}, cached: {}, to run: {}".format(len(keys), len(keys) - len(missing), len(missing)))
+	if missing:
+		with ProcessPoolExecutor(max_workers=processes or os.cpu_count() or 1) as executor:
+			futures = dict()
+			for key, params, seed in missing:
+				futures[executor.submit(evaluate, params, seed, total_time, targets)] = key
+			for future in as_completed(futures):
+				key = futures[future]
+				results[key] = future.result()
+				cache.put(key, results[key])
+	return [results[key] for key, params, seed in keys]
+
+
+def rank(results):
+	"""
+	average the scores of each parameter dict over its seeds
+	:return: list of (mean score, params), best first
+	"""
+	scores = dict()
+	for result in results:
+		text = json.dumps(result["params"], sort_keys=True)
+		scores.setdefault(text, []).append(result["score"])
+	ranked = [(float(np.mean(values)), json.loads(text)) for text, values in scores.items()]
+	ranked.sort(key=lambda item: item[0])
+	return ranked
+
+
+def parse_value(text):
+	try:
+		return json.loads(text)
+	except ValueError:
+		return text
+
+
+def parse_space(grid_items, range_items):
+	"""
+	:param grid_items: list of "agent.attribute=v1,v2,..."
+	:param range_items: list of "agent.attribute=low:high"
+	:return: dict for grid or random_search
+	"""
+	space = dict()
+	for item in grid_items:
+		key, _, values = item.partition("=")
+		space[key] = [parse_value(value) for value in values.split(",")]
+	for item in range_items:
+		key, _, bounds = item.partition("=")
+		low, _, high = bounds.partition(":")
+		space[key] = (float(low), float(high))
+	if not space:
+		sys.exit("[Error] no parameters to sweep, use --grid or --range")
+	return space
+
+
+def main_calibration():
+	parser = argparse.ArgumentParser(description="Sweep agent parameters and score the runs against stylized facts")
+	parser.add_argument("--grid", action="append", default=[], help="agent.attribute=v1,v2,...")
+	parser.add_argument("--range", action="append", default=[], help="agent.attribute=low:high, for --samples")
+	parser.add_argument("--samples", type=int, default=0, help="random search with this many points instead of a grid")
+	parser.add_argument("--seeds", type=int, default=4)
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--total-time", type=int, default=306000)
+	parser.add_argument("--processes", type=int, default=None)
+	parser.add_argument("--cache", default=os.path.join("data", "calibration"))
+	parser.add_argument("--top", type=int, default=5)
+	args = parser.parse_args()
+
+	space = parse_space(args.grid, args.range)
+	if args.samples:
+		points = random_search(space, args.samples, args.seed)
+	elif args.range:
+		sys.exit("[Error] --range needs --samples")
+	else:
+		points = grid(space)
+	seeds = ensemble.ensemble_seeds(args.seeds, args.seed)
+	results = sweep(points, seeds, args.total_time, args.cache, args.processes)
+	for mean_score, params in rank(results)[:args.top]:
+		print("{:.4f} {}".format(mean_score, params))
+
+
+if __name__ == "__main__":
+	main_calibration()
@@ -0,0 +1,135 @@
+import os
+import argparse
+import numpy as np
+from scipy.stats import norm, kurtosis
+from concurrent.futures import ProcessPoolExecutor
+import main
+import population
+import statistics
+from ring_series import held_values
+
+
+def ensemble_seeds(runs, seed=None):
+	"""
+	independent seeds for the runs of an ensemble, derived from one seed
+	:param runs: number of runs
+	:param seed: seed of the ensemble, fresh entropy if None
+	:return: list of int seeds
+	"""
+	children = np.random.SeedSequence(seed).spawn(runs)
+	return [int(child.generate_state(1)[0]) for child in children]
+
+
+def run_member(seed, total_time, config=None):
+	"""
+	Simulate one day of the ensemble, run in a worker process.
+	Only compact arrays go back to the parent, not the exchange.
+	:param config: population config, see population.load_config
+	:return: dict of seed, prices, mid_prices and orders_signs
+	"""
+	exchange, agents, mm_order = main.run_simulation(total_time, seed, verbose=False, config=config)
+	return {
+		"seed": seed,
+		"prices": held_values(exchange.prices)[1],
+		"mid_prices": held_values(exchange.mid_prices)[1],
+		"orders_signs": held_values(exchange.orders_signs, np.int8)[1]}
+
+
+def run_ensemble(seeds, total_time, processes=None, config=None):
+	"""
+	Simulate independent days with the same agents, one per seed, over a process pool.
+	The days share nothing, so the runtime falls close to linearly with the processes.
+	:param seeds: list of seeds, see ensemble_seeds
+	:param total_time: number of periods of each day
+	:param processes: worker processes, all cpus if None, no pool if 1
+	:param config: population config, see population.load_config; one trader of each type if None
+	:return: list of the results of run_member, in seed order
+	"""
+	if processes is None:
+		processes = os.cpu_count() or 1
+	processes = min(processes, len(seeds))
+	if processes <= 1:
+		return [run_member(seed, total_time, config) for seed in seeds]
+	with ProcessPoolExecutor(max_workers=processes) as executor:
+		return list(executor.map(run_member, seeds, [total_time] * len(seeds), [config] * len(seeds)))
+
+
+def confidence_band(values, confidence=0.95):
+	"""
+	mean over the runs, and the normal confidence interval of the mean
+	:param values: numpy array, one row per run
+	:return: dict of mean, lower and upper, along the remaining axes
+	"""
+	values = np.asarray(values, dtype=np.float64)
+	mean = np.nanmean(values, axis=0)
+	count = np.sum(~np.isnan(values), axis=0)
+	if values.shape[0] > 1:
+		standard_error = np.nanstd(values, axis=0, ddof=1) / np.sqrt(count)
+	else:
+		standard_error = np.full(np.shape(mean), np.nan)
+	half_width = norm.ppf(0.5 + confidence / 2) * standard_error
+	return {"mean": mean, "lower": mean - half_width, "upper": mean + half_width}
+
+
+def ensemble_statistics(members, lags=20, confidence=0.95):
+	"""
+	Aggregate the runs of an ensemble: the mean price and mid-price paths, and the per-run
+	return kurtosis and order sign auto-correlation, each with a confidence band.
+	:param members: list of the results of run_member
+	:param lags: lags of the order sign auto-correlation
+	:param confidence: level of the confidence bands
+	:return: dict of statistic name -> confidence_band
+	"""
+	prices = np.stack([member["prices"] for member in members])
+	mid_prices = np.stack([member["mid_prices"] for member in members])
+	returns = np.diff(np.log(mid_prices), axis=1)
+	sign_acfs = []
+	for member in members:
+		signs = member["orders_signs"].astype(np.float64)
+		sign_acfs.append(statistics.auto_correlation(signs, min(lags, len(signs) - 2), absolute=False))
+	acf_length = min(len(acf) for acf in sign_acfs)
+	result = dict()
+	result["prices"] = confidence_band(prices, confidence)
+	result["mid_prices"] = confidence_band(mid_prices, confidence)
+	result["returns_kurtosis"] = confidence_band(kurtosis(returns, axis=1), confidence)
+	result["orders_signs_acf"] = confidence_band([acf[:acf_length] for acf in sign_acfs], confidence)
+	return result
+
+
+def save_ensemble(file_name, seeds, result):
+	"""
+	write the seeds and the statistics of an ensemble into one .npz archive,
+	with keys like prices_mean and prices_lower
+	"""
+	arrays = {"seeds": np.array(seeds, dtype=np.uint64)}
+	for name, band in result.items():
+		for key, value in band.items():
+			arrays["{}_{}".format(name, key)] = value
+	np.savez(file_name, **arrays)
+
+
+def main_ensemble():
+	parser = argparse.ArgumentParser(description="Simulate independent seeded days and aggregate their statistics")
+	parser.add_argument("--runs", type=int, default=16)
+	parser.add_argument("--total-time", type=int, default=306000)
+	parser.add_argument("--seed", type=int, default=None)
+	parser.add_argument("--processes", type=int, default=None)
+	parser.add_argument("--output", default=os.path.join("data", "ensemble.npz"))
+	parser.add_argument("--config", default=None, help="population config, see population.load_config")
+	args = parser.parse_args()
+
+	config = population.load_config(args.config) if args.config else None
+	seeds = ensemble_seeds(args.runs, args.seed)
+	members = run_ensemble(seeds, args.total_time, args.processes, config)
+	result = ensemble_statistics(members)
+	output_dir = os.path.dirname(args.output)
+	if output_dir and not os.path.exists(output_dir):
+		os.makedirs(output_dir)
+	save_ensemble(args.output, seeds, result)
+	kurtosis_band = result["returns_kurtosis"]
+	print("runs: {}, returns kurtosis: {:.4f} [{:.4f}, {:.4f}]".format(
+		len(members), kurtosis_band["mean"], kurtosis_band["lower"], kurtosis_band["upper"]))
+
+
+if __name__ == "__main__":
+	main_ensemble()
@@ -0,0 +1,239 @@
+import os
+import sys
+import json
+import queue
+import threading
+import numpy as np
+from event_log import EventLog, Interner
+
+# file formats of save_event_log, besides the text dumps of Exchange
+FILE_FORMATS = ["npz", "npy", "parquet"]
+
+
+def event_log_path(file_name, file_format=None):
+	"""
+	The path of an event log file: "npz" files always end in .npz, the suffix np.savez adds,
+	so that save_event_log and load_event_log agree whether or not file_name has it.
+	:param file_format: one of FILE_FORMATS, or None to follow the path, as when loading
+	"""
+	if file_format is None:
+		if os.path.isdir(file_name) or file_name.endswith(".parquet"):
+			return file_name
+		file_format = "npz"
+	if file_format == "npz" and not file_name.endswith(".npz"):
+		return file_name + ".npz"
+	return file_name
+
+
+def save_event_log(event_log, file_name, file_format="npz"):
+	"""
+	Write the columns of an event log in a binary format, overwriting file_name.
+	"npz": one .npz archive holding every column.
+	"npy": a directory holding one .npy file per column, which load_event_log can memory-map.
+	"parquet": one Parquet file, needs pyarrow.
+	'str' columns are written as int codes, along with the list of interned strings.
+	:param event_log: the instance of EventLog
+	:param file_name: file, or directory for "npy", to write; .npz is added for "npz" if missing
+	:param file_format: one of FILE_FORMATS
+	"""
+	file_name = event_log_path(file_name, file_format)
+	columns = dict()
+	for name in event_log.fields:
+		columns[name] = event_log.column(name)
+	kinds = ["{}:{}".format(name, event_log.kinds[name]) for name in event_log.fields]
+	save_columns(file_name, columns, kinds, list(event_log.interner.names), file_format)
+
+
+def save_columns(file_name, columns, kinds, strings, file_format="npz"):
+	"""
+	Write columns of an event log, see save_event_log
+	:param columns: dict of field name -> NumPy array
+	:param kinds: list of "name:kind" items, in field order
+	:param strings: interned strings, indexed by code
+	"""
+	if file_format == "npz":
+		np.savez(file_name, _kinds=np.array(kinds), _strings=np.array(strings, dtype=str), **columns)
+	elif file_format == "npy":
+		if not os.path.exists(file_name):
+			os.makedirs(file_name)
+		for name in columns:
+			np.save(os.path.join(file_name, name + ".npy"), columns[name])
+		np.save(os.path.join(file_name, "_kinds.npy"), np.array(kinds))
+		np.save(os.path.join(file_name, "_strings.npy"), np.array(strings, dtype=str))
+	elif file_format == "parquet":
+		import pyarrow
+		import pyarrow.parquet
+		table = pyarrow.table(columns)
+		metadata = {b"kinds": json.dumps(kinds).encode(), b"strings": json.dumps(strings).encode()}
+		table = table.replace_schema_metadata(metadata)
+		pyarrow.parquet.write_table(table, file_name)
+	else:
+		sys.exit("[Error] bad file_format value")
+
+
+def load_event_log(file_name, mmap=True, record=None):
+	"""
+	Load an event log written by save_event_log, without any string parsing.
+	The returned EventLog is meant for reading: column() views, indexing and iteration.
+	:param file_name: file, or directory for "npy", to read; the format follows from the path,
+		and a path which is neither a directory nor a .parquet file is read as .npz
+	:param mmap: memory-map the columns of the "npy" format instead of reading them
+	:param record: record class of the log, as for EventLog
+	:return: the instance of EventLog
+	"""
+	file_name = event_log_path(file_name)
+	columns, kinds, strings = load_columns(file_name, mmap)
+	return make_event_log(columns, kinds, strings, record)
+
+
+def load_columns(file_name, mmap=True):
+	"""
+	Read columns written by save_columns
+	:return: dict of field name -> NumPy array, list of "name:kind" items, list of interned strings
+	"""
+	if os.path.isdir(file_name):
+		mmap_mode = "r" if mmap else None
+		kinds = np.load(os.path.join(file_name, "_kinds.npy")).tolist()
+		strings = np.load(os.path.join(file_name, "_strings.npy")).tolist()
+		columns = dict()
+		for item in kinds:
+			name = item.split(":")[0]
+			columns[name] = np.load(os.path.join(file_name, name + ".npy"), mmap_mode=mmap_mode)
+	elif file_name.endswith(".parquet"):
+		import pyarrow.parquet
+		table = pyarrow.parquet.read_table(file_name)
+		kinds = json.loads(table.schema.metadata[b"kinds"])
+		strings = json.loads(table.schema.metadata[b"strings"])
+		columns = dict()
+		for name in table.column_names:
+			columns[name] = table.column(name).to_numpy()
+	else:
+		with np.load(file_name) as data:
+			kinds = data["_kinds"].tolist()
+			strings = data["_strings"].tolist()
+			columns = dict()
+			for item in kinds:
+				name = item.split(":")[0]
+				columns[name] = data[name]
+	return columns, kinds, strings
+
+
+def make_event_log(columns, kinds, strings, record=None):
+	interner = Interner()
+	for name in strings:
+		interner.code(name)
+	fields = [tuple(item.split(":")) for item in kinds]
+	event_log = EventLog(fields, interner, record)
+	for name, kind in fields:
+		event_log.columns[name] = columns[name]
+	event_log.size = len(columns[fields[0][0]]) if fields else 0
+	return event_log
+
+
+def load_spilled_event_log(directory, name, session=None, record=None):
+	"""
+	Load the chunks of an event log spilled by an EventSpiller, in order.
+	:param directory: directory of the EventSpiller
+	:param name: name the event log was spilled under
+	:param session: only load this session, or all sessions if None
+	:param record: record class of the log, as for EventLog
+	:return: the instance of EventLog
+	"""
+	if session is None:
+		sessions = sorted(item for item in os.listdir(directory) if item.startswith("session_"))
+	else:
+		sessions = [EventSpiller.session_dir_name(session)]
+	chunks = []
+	for session_dir in sessions:
+		log_dir = os.path.join(directory, session_dir, name)
+		if os.path.isdir(log_dir):
+			for chunk_file in sorted(os.listdir(log_dir)):
+				chunks.append(load_columns(os.path.join(log_dir, chunk_file)))
+	if not chunks:
+		sys.exit("[Error] no spilled chunks of {} in {}".format(name, directory))
+	# interned strings only grow, so the last chunk knows every code
+	kinds = chunks[-1][1]
+	strings = chunks[-1][2]
+	columns = dict()
+	for item in kinds:
+		field = item.split(":")[0]
+		columns[field] = np.concatenate([chunk[0][field] for chunk in chunks])
+	return make_event_log(columns, kinds, strings, record)
+
+
+class EventSpiller:
+	"""
+	Write chunks of event logs to disk from a background thread, so a run keeps
+	only a bounded tail of each log in memory. Chunks go to
+	directory/session_NNNN/<log name>/NNNNNN.npz, a new session directory per rotate().
+	"""
+
+	def __init__(self, directory, session=0, max_queued_chunks=8):
+		"""
+		:param directory: directory to write into
+		:param session: number of the first session
+		:param max_queued_chunks: chunks waiting for the writer before write() blocks
+		"""
+		self.directory = directory
+		self.session = session
+		self.chunk_numbers = dict()
+		self.error = None
+		self.queue = queue.Queue(max_queued_chunks)
+		self.writer = threading.Thread(target=self.write_chunks, daemon=True)
+		self.writer.start()
+
+	@staticmethod
+	def session_dir_name(session):
+		return "session_{:04d}".format(session)
+
+	def write(self, name, columns, kinds, strings):
+		"""
+		queue a chunk of an event log for writing
+		:param name: name of the event log
+		:param columns: dict of field name -> NumPy array, no longer changed by the caller
+		:param kinds: list of "name:kind" items, in field order
+		:param strings: interned strings, indexed by code
+		"""
+		if self.error is not None:
+			raise self.error
+		chunk_number = self.chunk_numbers.get(name, 0)
+		self.chunk_numbers[name] = chunk_number + 1
+		log_dir = os.path.join(self.directory, self.session_dir_name(self.session), name)
+		file_name = os.path.join(log_dir, "{:06d}.npz".format(chunk_number))
+		self.queue.put((log_dir, file_name, columns, kinds, strings))
+
+	def write_chunks(self):
+		while True:
+			item = self.queue.get()
+			if item is None:
+				self.queue.task_done()
+				break
+			log_dir, file_name, columns, kinds, strings = item
+			try:
+				if not os.path.exists(log_dir):
+					os.makedirs(log_dir)
+				save_columns(file_name, columns, kinds, strings)
+			except Exception as error:
+				self.error = error
+			self.queue.task_done()
+
+	def rotate(self, session):
+		"""
+		write the following chunks into the directory of a new session
+		"""
+		self.session = session
+		self.chunk_numbers = dict()
+
+	def wait(self):
+		"""
+		block until every queued chunk is on disk
+		"""
+		self.queue.join()
+		if self.error is not None:
+			raise self.error
+
+	def close(self):
+		self.queue.put(None)
+		self.writer.join()
+		if self.error is not None:
+			raise self.error
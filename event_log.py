@@ -0,0 +1,238 @@
+import numpy as np
+
+
+class Interner:
+	"""
+	Map repeated strings, like trader ids and order types, to small ints and back.
+	"""
+
+	def __init__(self):
+		self.codes = {}
+		self.names = []
+
+	def code(self, name):
+		"""
+		:param name: string to intern
+		:return: the int code of name, assigned on first use
+		"""
+		code = self.codes.get(name)
+		if code is None:
+			code = len(self.names)
+			self.codes[name] = code
+			self.names.append(name)
+		return code
+
+	def name(self, code):
+		return self.names[code]
+
+
+class EventLog:
+	"""
+	Columnar store of event records, one typed NumPy array per field.
+	Appended records are staged as tuples and moved into the columns in chunks,
+	strings are interned to int codes, and missing fields are stored as NaN or -1.
+	It can be appended to and iterated like the list of dicts it replaces.
+	With an EventSpiller attached, older records are streamed to disk and only a bounded
+	tail stays in memory; len() still counts every record, indexing and iteration cover the tail.
+	retain() keeps the same bounded tail without a spiller, dropping the older records.
+	"""
+
+	def __init__(self, fields, interner=None, record=None, chunk_size=4096):
+		"""
+		:param fields: list of (name, kind) pairs, kind is 'int', 'float' or 'str'
+		:param interner: the Interner for 'str' fields, shared between logs so codes agree
+		:param record: class building a record from all field values, like a namedtuple;
+			if None, records are dicts holding only the fields that are set
+		:param chunk_size: number of staged records moved into the columns at a time
+		"""
+		self.fields = tuple(name for name, kind in fields)
+		self.kinds = dict(fields)
+		if interner is None:
+			interner = Interner()
+		self.interner = interner
+		self.record = record
+		self.chunk_size = chunk_size
+		self.pending = []
+		# records in the columns, and records before them which have been spilled to disk
+		self.size = 0
+		self.offset = 0
+		self.spiller = None
+		self.name = None
+		self.flush_size = None
+		self.tail_size = None
+		# drop the records older than the tail even without a spiller
+		self.retaining = False
+		self.columns = {}
+		for name, kind in fields:
+			self.columns[name] = np.empty(chunk_size, dtype=self.dtype(kind))
+
+	@staticmethod
+	def dtype(kind):
+		if kind == 'float':
+			return np.float64
+		if kind == 'str':
+			return np.int32
+		return np.int64
+
+	@staticmethod
+	def missing(kind):
+		if kind == 'float':
+			return np.nan
+		return -1
+
+	def append(self, record):
+		"""
+		:param record: dict of field values, or a tuple in field order
+		"""
+		if isinstance(record, dict):
+			record = tuple([record.get(name) for name in self.fields])
+		self.pending.append(record)
+		if len(self.pending) >= self.chunk_size:
+			self.flush()
+
+	def flush(self):
+		"""
+		move the staged records into the typed columns
+		"""
+		if not self.pending:
+			return
+		count = len(self.pending)
+		end = self.size + count
+		for i, name in enumerate(self.fields):
+			kind = self.kinds[name]
+			missing = self.missing(kind)
+			if kind == 'str':
+				code = self.interner.code
+				values = [missing if row[i] is None else code(row[i]) for row in self.pending]
+			else:
+				values = [missing if row[i] is None else row[i] for row in self.pending]
+			column = self.columns[name]
+			if end > len(column):
+				grown = np.empty(max(end, 2 * len(column)), dtype=column.dtype)
+				grown[:self.size] = column[:self.size]
+				self.columns[name] = column = grown
+			column[self.size:end] = values
+		self.size = end
+		self.pending = []
+		if (self.spiller is not None or self.retaining) and self.size >= self.flush_size + self.tail_size:
+			self.spill(self.tail_size)
+
+	def attach_spiller(self, spiller, name, flush_size=65536, tail_size=None):
+		"""
+		stream the records to disk through an EventSpiller
+		:param spiller: the instance of event_io.EventSpiller
+		:param name: name of this log in the spill directory
+		:param flush_size: minimum number of records in a spilled chunk
+		:param tail_size: number of latest records kept in memory, flush_size if None
+		"""
+		self.spiller = spiller
+		self.name = name
+		self.flush_size = flush_size
+		self.tail_size = flush_size if tail_size is None else tail_size
+
+	def detach_spiller(self):
+		self.spiller = None
+
+	def retain(self, tail_size, flush_size=None):
+		"""
+		keep only a bounded tail of the records in memory, dropping the older ones
+		:param tail_size: number of latest records kept in memory
+		:param flush_size: minimum number of records dropped at a time, tail_size if None
+		"""
+		self.retaining = True
+		self.tail_size = tail_size
+		self.flush_size = tail_size if flush_size is None else flush_size
+
+	def spill(self, keep=0, write_empty=False):
+		"""
+		hand all but the latest keep records to the spiller, and drop them from memory;
+		without a spiller they are only dropped, when the log is retaining
+		:param write_empty: write a chunk even if it has no records, so that the log has a file on disk
+		"""
+		self.flush()
+		count = max(self.size - keep, 0)
+		if self.spiller is None and not self.retaining:
+			return
+		if count == 0 and (self.spiller is None or not write_empty):
+			return
+		chunk = dict()
+		capacity = max(self.chunk_size, keep + (self.flush_size or 0) + self.chunk_size)
+		for name in self.fields:
+			column = self.columns[name]
+			# the spilled slice is left untouched, the tail moves to a new array
+			chunk[name] = column[:count]
+			tail = np.empty(capacity, dtype=column.dtype)
+			tail[:self.size - count] = column[count:self.size]
+			self.columns[name] = tail
+		if self.spiller is not None:
+			kinds = ["{}:{}".format(name, self.kinds[name]) for name in self.fields]
+			self.spiller.write(self.name, chunk, kinds, list(self.interner.names))
+		self.offset += count
+		self.size -= count
+
+	def column(self, name):
+		"""
+		read-only NumPy view of a field over all records, without copying
+		'str' fields are returned as int codes of self.interner
+		"""
+		self.flush()
+		view = self.columns[name][:self.size]
+		view.flags.writeable = False
+		return view
+
+	def decode(self, name, values):
+		"""
+		turn a list of stored values of a field back into python values, None where missing
+		"""
+		kind = self.kinds[name]
+		if kind == 'float':
+			return [None if value != value else value for value in values]
+		if kind == 'str':
+			names = self.interner.names
+			return [None if value < 0 else names[value] for value in values]
+		return [None if value < 0 else value for value in values]
+
+	def rows(self, start, stop):
+		"""
+		:return: list of value tuples, in field order, of the records from start to stop
+		"""
+		self.flush()
+		columns = [self.decode(name, self.columns[name][start:stop].tolist()) for name in self.fields]
+		return list(zip(*columns))
+
+	def make_record(self, values):
+		if self.record is not None:
+			return self.record(*values)
+		return {name: value for name, value in zip(self.fields, values) if value is not None}
+
+	def __getitem__(self, index):
+		length = len(self)
+		if index < 0:
+			index += length
+		if index < 0 or index >= length:
+			raise IndexError("event index out of range")
+		self.flush()
+		index -= self.offset
+		if index < 0:
+			raise IndexError("event has been spilled to disk or dropped")
+		return self.make_record(self.rows(index, index + 1)[0])
+
+	def __iter__(self):
+		self.flush()
+		length = self.size
+		for start in range(0, length, self.chunk_size):
+			for values in self.rows(start, min(start + self.chunk_size, length)):
+				yield self.make_record(values)
+
+	def __len__(self):
+		return self.offset + self.size + len(self.pending)
+
+	def clear(self):
+		"""
+		drop every record, with a spiller attached after writing the ones not yet on disk
+		"""
+		if self.spiller is not None:
+			self.spill()
+		self.pending = []
+		self.size = 0
+		self.offset = 0
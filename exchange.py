@@ -1,6 +1,13 @@
+import os
 import sys
+import numpy as np
 from order_book import OrderBook
-import copy
+from order import OrderEvent
+from event_log import EventLog
+from rolling import RollingMean
+from ring_series import RingSeries, held_values
+from market_data import MarketDataView
+import event_io
 
 
 class Exchange(OrderBook):
@@ -15,38 +22,196 @@ class Exchange(OrderBook):
 		self.price = init_price
 		self.prices = []
 		self.all_deal_prices = []
-		self.trade_prices_with_time = []
+		self.trade_prices_with_time = EventLog([('time', 'int'), ('price', 'float')], self.interner)
 		# price spread
 		self.spread = init_spread
 		# minimum size of price change
 		self.tick_size = tick_size
-		self.all_orders_for_record = []
-		self.exception_transaction = []
+		self.all_orders_for_record = EventLog([
+			('time', 'int'),
+			('order_type', 'str'),
+			('trader_id', 'str'),
+			('price', 'float'),
+			('quantity', 'int'),
+			('quote_id', 'int')], self.interner, OrderEvent)
+		self.exception_transaction = EventLog([
+			('type', 'str'),
+			('time', 'int'),
+			('price', 'float'),
+			('quantity', 'int'),
+			('bid', 'str'),
+			('bid_order_time', 'int'),
+			('ask', 'str'),
+			('ask_order_time', 'int')], self.interner)
 		self.orders_signs = []
-		self.mid_quotes = []
+		self.mid_quotes = EventLog([('time', 'int'), ('mid_quote', 'float'), ('quantity', 'int')], self.interner)
 		self.mid_prices = []
+		# cached top of book for the agents, see MarketDataView
+		self.market_data = MarketDataView(self)
+		# rolling means of the deal prices, by window size, updated every period, see price_window
+		self.price_windows = dict()
+		# writes the event logs to disk while running, see start_spill
+		self.spiller = None
+		# number of latest values of each series kept in memory, None keeps them all, see retain
+		self.retention = None
+		# number of the current session, a trading day, see open_session
+		self.session = 0
 
-	def add_order(self, order):
+	def event_logs(self):
 		"""
-		add a quote/order to the exchange and update all internal records; return unique i.d.
+		:return: dict of name -> EventLog of the exchange's records
+		"""
+		return {
+			"tape": self.tape,
+			"orders": self.all_orders_for_record,
+			"exceptions": self.exception_transaction,
+			"mid_quotes": self.mid_quotes,
+			"trade_prices": self.trade_prices_with_time}
+
+	def series(self):
+		"""
+		:return: dict of name -> per-period series of the exchange, with their NumPy types
+		"""
+		return {
+			"prices": (self.prices, np.float64),
+			"mid_prices": (self.mid_prices, np.float64),
+			"all_deal_prices": (self.all_deal_prices, np.float64),
+			"orders_signs": (self.orders_signs, np.int8)}
+
+	def retain(self, capacity, directory=None, flush_size=None, session=0):
+		"""
+		Keep only the latest capacity values of every series, and the latest capacity records
+		of every event log, in memory, so memory stays flat however many periods are run.
+		The series become RingSeries, which the agents index as before for recent history;
+		capacity has to cover the longest look-back of the agents and price windows.
+		With a directory, the full history is streamed to disk as in start_spill,
+		the series as logs of one "value" column.
+		:param capacity: number of latest values and records kept in memory
+		:param directory: directory to stream the history into, None drops the older values
+		:param flush_size: minimum number of records per chunk file, or dropped at a time, capacity if None
+		:param session: number of the session the following records belong to
+		"""
+		if flush_size is None:
+			flush_size = capacity
+		if directory is not None:
+			self.start_spill(directory, flush_size, capacity, session)
+		else:
+			for event_log in self.event_logs().values():
+				event_log.retain(capacity, flush_size)
+		for name, (values, dtype) in self.series().items():
+			series = RingSeries(capacity, dtype)
+			if self.spiller is not None:
+				series.attach_spiller(self.spiller, name)
+			series.extend(values)
+			setattr(self, name, series)
+		self.retention = capacity
+
+	def ring_series(self):
+		"""
+		:return: dict of name -> series kept as a RingSeries, see retain
+		"""
+		return {name: values for name, (values, dtype) in self.series().items() if isinstance(values, RingSeries)}
+
+	def start_spill(self, directory, flush_size=65536, tail_size=None, session=0):
+		"""
+		Stream the event logs to disk while running, so memory stays flat however long the run is.
+		Each log keeps only its latest tail_size records in memory; dumps then cover that tail,
+		and event_io.load_spilled_event_log reads a whole log back.
+		:param directory: directory to write the chunks into
+		:param flush_size: minimum number of records per chunk file
+		:param tail_size: number of latest records kept in memory, flush_size if None
+		:param session: number of the session the following records belong to
+		"""
+		self.spiller = event_io.EventSpiller(directory, session)
+		for name, event_log in self.event_logs().items():
+			event_log.attach_spiller(self.spiller, name, flush_size, tail_size)
+
+	def rotate_spill(self, session):
+		"""
+		write everything recorded so far, then start the chunk files of a new session
+		"""
+		for event_log in self.event_logs().values():
+			event_log.spill(write_empty=True)
+		for series in self.ring_series().values():
+			series.spill()
+		self.spiller.rotate(session)
+
+	def stop_spill(self):
+		"""
+		write the remaining records and wait for the writer thread to finish
+		"""
+		for event_log in self.event_logs().values():
+			event_log.spill(write_empty=True)
+			event_log.detach_spiller()
+		for series in self.ring_series().values():
+			series.spill()
+			series.detach_spiller()
+		self.spiller.close()
+		self.spiller = None
+
+	def open_session(self, session):
+		"""
+		Start a session, a trading day: the session records of the book start afresh,
+		and the event logs are rotated: with spilling on, the following records go to the files
+		of the new session, otherwise the records of the earlier sessions are dropped.
+		:param session: number of the session
+		"""
+		self.bids.session_extreme = None
+		self.asks.session_extreme = None
+		if self.spiller is not None:
+			if self.spiller.session != session:
+				self.rotate_spill(session)
+		elif session != self.session:
+			for event_log in self.event_logs().values():
+				event_log.clear()
+		self.session = session
+
+	def close_session(self, cur_time, carry_over=False):
+		"""
+		End the current session. As at the close of a day, every resting order is cancelled,
+		so the next session opens on an empty book, unless carry_over keeps the book as it is.
+		:param cur_time: last period of the session, the time of the cancel records
+		:param carry_over: keep the resting orders for the next session
+		"""
+		if carry_over:
+			return
+		for trader_id in list(self.bids.orders):
+			self.del_trader_all_orders(trader_id, ["Bid"], cur_time)
+		for trader_id in list(self.asks.orders):
+			self.del_trader_all_orders(trader_id, ["Ask"], cur_time)
+
+	def assign_quote_id(self, order):
+		"""
+		give a new order its unique quote i.d. and record its sign in the order flow
 		:param order: order, the instance of the class Order
-		:return
+		:return: the quote i.d.
 		"""
 		order.quote_id = self.quote_id
 		self.quote_id += 1
 		if order.order_type == 'Bid':
 			self.orders_signs.append(1)
-			response = self.bids.book_add(order)
-			best_price = self.bids.lob_anon[-1][0]
-			self.bids.best_price = best_price
-			self.bids.best_trader_id = self.bids.lob[best_price][1][0][2]
 		else:
 			self.orders_signs.append(-1)
-			response = self.asks.book_add(order)
-			best_price = self.asks.lob_anon[0][0]
-			self.asks.best_price = best_price
-			self.asks.best_trader_id = self.asks.lob[best_price][1][0][2]
-		return [order.quote_id, response]
+		return order.quote_id
+
+	def add_order(self, order):
+		"""
+		add a quote/order to the exchange and update all internal records; return unique i.d.
+		the order is rested on the book as it is, without matching
+		:param order: order, the instance of the class Order
+		:return
+		"""
+		self.assign_quote_id(order)
+		return [order.quote_id, self.rest_order(order)]
+
+	def rest_order(self, order):
+		"""
+		place an order which already has a quote i.d. on its side of the book
+		"""
+		if order.order_type == 'Bid':
+			return self.bids.book_add(order)
+		else:
+			return self.asks.book_add(order)
 
 	def del_trader_all_orders(self, trader_id, order_types, cur_time):
 		"""
@@ -66,7 +231,7 @@ class Exchange(OrderBook):
 
 	def del_oldest_order(self, trader_id, order_type, cur_time):
 		"""
-		delete any existing orders from a certain trader
+		delete the earliest resting order of a certain trader on one side of the book
 		:param trader_id: ID of a certain trader, like market maker
 		:param cur_time: current time
 		:param order_type:
@@ -83,44 +248,103 @@ class Exchange(OrderBook):
 	def del_order(self, order_time, order):
 		"""
 		delete a trader's quot/order from the exchange, update all internal records
-		:param order_time:
-		:param order:
-		:return:
+		:param order_time: current time
+		:param order: the resting order, identified by its quote_id
+		:return: True if the order was still on the book
 		"""
-		if order.order_type == 'Bid':
-			self.bids.book_del(order.train_id)
-			cancel_record = {'type': 'Cancel', 'time': order_time, 'order': order}
-			self.tape.append(cancel_record)
-		elif order.order_type == 'Ask':
-			self.asks.book_del(order.train_id)
-			cancel_record = {'type': 'Cancel', 'time': order_time, 'order': order}
-			self.tape.append(cancel_record)
-		else:
+		if order.order_type not in ('Bid', 'Ask'):
 			# neither bid nor ask?
 			sys.exit("[Error] bad order_type value")
+		return self.cancel_order(order.quote_id, order_time)
 
-	def make_match(self, order, cur_time):
+	def get_order(self, quote_id):
 		"""
-		Making a match between Bid LOB and Ask LOB.
-		:param order: newest order
+		look up a resting order by its quote i.d.
+		:param quote_id: quote i.d. assigned by add_order
+		:return: the resting order, or None if it has been filled or cancelled
+		"""
+		order = self.bids.quotes.get(quote_id)
+		if order is None:
+			order = self.asks.quotes.get(quote_id)
+		return order
+
+	def get_trader_quote_ids(self, trader_id, order_type):
+		"""
+		quote i.d.s of the resting orders of a trader on one side of the book, oldest first
+		:param trader_id: ID of a certain trader
+		:param order_type: "Bid" or "Ask"
+		:return: list of quote i.d.s
+		"""
+		if order_type == "Bid":
+			half = self.bids
+		else:
+			half = self.asks
+		return list(half.orders.get(trader_id, ()))
+
+	def cancel_order(self, quote_id, cur_time):
+		"""
+		cancel a single resting order by its quote i.d.
+		:param quote_id: quote i.d. assigned by add_order
 		:param cur_time: current time
-		:return: trade result or None
+		:return: True if the order was still on the book
 		"""
-		if self.asks.best_quantity is None or self.bids.best_quantity is None:
-			return None
-		best_ask_price = self.asks.best_price
-		best_ask_trader_id = self.asks.best_trader_id
-		best_bid_price = self.bids.best_price
-		best_bid_trader_id = self.bids.best_trader_id
+		if quote_id in self.bids.quotes:
+			order = self.bids.order_del(quote_id)
+		elif quote_id in self.asks.quotes:
+			order = self.asks.order_del(quote_id)
+		else:
+			return False
+		cancel_record = {'type': 'Cancel', 'time': cur_time, 'trader_id': order.trader_id, 'quote_id': quote_id}
+		self.tape.append(cancel_record)
+		return True
 
-		if best_bid_price >= best_ask_price:
+	def reduce_order(self, quote_id, quantity, cur_time):
+		"""
+		reduce the quantity of a single resting order, keeping its time priority
+		:param quote_id: quote i.d. assigned by add_order
+		:param quantity: quantity to take off the order
+		:param cur_time: current time
+		:return: True if the order was still on the book
+		"""
+		if quote_id in self.bids.quotes:
+			order = self.bids.order_reduce(quote_id, quantity)
+		elif quote_id in self.asks.quotes:
+			order = self.asks.order_reduce(quote_id, quantity)
+		else:
+			return False
+		cancel_record = {
+			'type': 'Cancel',
+			'time': cur_time,
+			'trader_id': order.trader_id,
+			'quote_id': quote_id,
+			'quantity': quantity}
+		self.tape.append(cancel_record)
+		return True
+
+	def make_match(self, order, cur_time):
+		"""
+		Sweep a new order through the opposite LOB, level by level, while its price crosses.
+		Each fill trades at the price of the resting order, and the incoming order's quantity
+		is reduced by the filled quantity.
+		:param order: newest order, not yet on the book
+		:param cur_time: current time
+		:return: list of trade results, empty if the order does not cross
+		"""
+		if order.order_type == "Bid":
+			fills = self.asks.sweep(order.price, order.quantity)
+		elif order.order_type == "Ask":
+			fills = self.bids.sweep(order.price, order.quantity)
+		else:
+			sys.exit("[Error] bad order.order_type value")
+		trades = []
+		for price, quantity, trader_id, order_time in fills:
 			if order.order_type == "Bid":
-				price = best_ask_price
-			elif order.order_type == "Ask":
-				price = best_bid_price
+				best_ask_trader_id, ask_order_time = trader_id, order_time
+				best_bid_trader_id, bid_order_time = order.trader_id, order.time
 			else:
-				sys.exit("[Error] bad order.order_type value")
-			quantity = min(self.asks.best_quantity, self.bids.best_quantity)
+				best_ask_trader_id, ask_order_time = order.trader_id, order.time
+				best_bid_trader_id, bid_order_time = trader_id, order_time
+			order.quantity -= quantity
 			transaction_record = {
 				'type': 'Trade',
 				'time': cur_time,
@@ -129,69 +353,112 @@ class Exchange(OrderBook):
 				'bid': best_bid_trader_id,
 				'quantity': quantity
 			}
-			ask_order_time = self.asks.delete_best(quantity)
-			bid_order_time = self.bids.delete_best(quantity)
 			self.tape.append(transaction_record)
 			self.all_deal_prices.append(price)
-			self.trade_prices_with_time.append({
-				"time": cur_time,
-				"price": price})
+			self.trade_prices_with_time.append((cur_time, price))
 			if abs(price - self.price) > 0.2:
-				exception_transaction = copy.deepcopy(transaction_record)
-				exception_transaction["ask_order_time"] = ask_order_time
-				exception_transaction["bid_order_time"] = bid_order_time
+				exception_transaction = dict(
+					transaction_record,
+					ask_order_time=ask_order_time,
+					bid_order_time=bid_order_time)
 				self.exception_transaction.append(exception_transaction)
 			self.price = price
-			return transaction_record
-		return None
+			trades.append(transaction_record)
+		return trades
 
 	def process_order(self, cur_time, order):
 		"""
-		Processing a new oder by invoking make_match method
+		Processing a new oder by invoking make_match method, the remaining quantity rests on the book
 		:param cur_time: current time
 		:param order: newest order
-		:param verbose:
 		:return: trade results
 		"""
-		[quote_id, response] = self.add_order(order)
-		order.quote_id = quote_id
-		order_back_up = copy.deepcopy(order)
-		self.all_orders_for_record.append(order_back_up)
-		trades = []
-		while True:
-			trade = self.make_match(order, cur_time)
-			if trade is not None:
-				trades.append(trade)
-			else:
-				break
-		if self.bids.best_price is not None and self.asks.best_price is not None:
-			mid_quote = round((self.asks.best_price + self.bids.best_price) / 2, 2)
-			self.mid_quotes.append({
-				"time": cur_time,
-				"mid_quote": mid_quote,
-				"quantity": order_back_up.quantity})
+		self.assign_quote_id(order)
+		order_event = OrderEvent.from_order(order)
+		self.all_orders_for_record.append(order_event)
+		trades = self.make_match(order, cur_time)
+		if order.quantity > 0:
+			self.rest_order(order)
+		elif order.order_type == 'Ask':
+			self.asks.record_quote(order)
+		mid_quote = self.market_data.mid_quote
+		if mid_quote is not None:
+			self.mid_quotes.append((cur_time, mid_quote, order_event.quantity))
 		return trades
 
+	def mid_price(self):
+		"""
+		:return: the current mid-price, or the last one if a side of the book is empty,
+		or the deal price before any mid-price
+		"""
+		mid_quote = self.market_data.mid_quote
+		if mid_quote is not None:
+			return mid_quote
+		if self.mid_prices:
+			return self.mid_prices[-1]
+		return self.price
+
+	def end_period(self):
+		"""
+		record the deal price and the mid-price at the end of a period
+		"""
+		self.prices.append(self.price)
+		self.mid_prices.append(self.mid_price())
+		for window in self.price_windows.values():
+			window.append(self.price)
+
+	def fill_periods(self, cur_time):
+		"""
+		Record the periods before cur_time which were skipped because no trader acted in them.
+		Nothing changed in those periods, so they repeat the current deal price and mid-price.
+		:param cur_time: current time, the series get one value per earlier period
+		"""
+		missing = cur_time - len(self.prices)
+		if missing > 0:
+			mid_price = self.mid_price()
+			self.prices.extend([self.price] * missing)
+			self.mid_prices.extend([mid_price] * missing)
+			for window in self.price_windows.values():
+				window.extend(self.price, missing)
+
+	def price_window(self, size):
+		"""
+		The rolling mean of the deal prices over the last size periods, shared by every agent
+		using that size and updated by the exchange at the end of each period.
+		:param size: window size, in periods
+		:return: the instance of RollingMean
+		"""
+		window = self.price_windows.get(size)
+		if window is None:
+			window = RollingMean(size)
+			window.fill(self.prices)
+			self.price_windows[size] = window
+		return window
+
 	def publish_lob(self, cur_time, verbose):
 		"""
 		this returns the LOB data "published" by the exchange,
 		i.e., what is accessible to the traders
+		the levels are a read-only snapshot from market_data, not the live lists of the book,
+		and only the length of the tape is given, see market_data.MarketDataView
 		"""
+		bids_lob, asks_lob = self.market_data.snapshot()
 		public_data = dict()
 		public_data['time'] = cur_time
+		public_data['version'] = self.market_data.version
 		public_data['bids'] = {
-			'best': self.bids.best_price,
-			'worst': self.bids.worstprice,
+			'best': self.market_data.best_bid,
+			'worst': self.bids.worst_price,
 			'n': self.bids.number_traders,
-			'lob': self.bids.lob_anon}
+			'lob': bids_lob}
 		public_data['asks'] = {
-			'best': self.asks.best_price,
-			'worst': self.asks.worstprice,
+			'best': self.market_data.best_ask,
+			'worst': self.asks.worst_price,
 			'sess_hi': self.asks.session_extreme,
 			'n': self.asks.number_traders,
-			'lob': self.asks.lob_anon}
+			'lob': asks_lob}
 		public_data['quote_id'] = self.quote_id
-		public_data['tape'] = self.tape
+		public_data['tape_length'] = len(self.tape)
 		if verbose:
 			print('publish_lob: t=%d' % cur_time)
 			print('BID_lob=%s' % public_data['bids']['lob'])
@@ -199,7 +466,16 @@ class Exchange(OrderBook):
 
 		return public_data
 
-	def tape_dump(self, file_name, file_mode, tape_mode):
+	def tape_dump(self, file_name, file_mode, tape_mode, file_format="text"):
+		"""
+		Write the tape, as "key: value" text lines or, with file_format in event_io.FILE_FORMATS,
+		as binary columns which event_io.load_event_log reads back; binary dumps always overwrite
+		"""
+		if file_format != "text":
+			event_io.save_event_log(self.tape, file_name, file_format)
+			if tape_mode == "wipe":
+				self.tape.clear()
+			return
 		dump_file = open(file_name, file_mode)
 		for tape_item in self.tape:
 			if tape_item["type"] == "Trade":
@@ -219,12 +495,16 @@ class Exchange(OrderBook):
 				))
 		dump_file.close()
 		if tape_mode == "wipe":
-			self.tape = []
+			self.tape.clear()
 
-	def exception_transaction_dump(self, file_name, file_mode):
+	def exception_transaction_dump(self, file_name, file_mode, file_format="text"):
 		"""
 		Currently tape_dump only writes a list of transactions
+		file_format as for tape_dump
 		"""
+		if file_format != "text":
+			event_io.save_event_log(self.exception_transaction, file_name, file_format)
+			return
 		dump_file = open(file_name, file_mode)
 		for tape_item in self.exception_transaction:
 			if tape_item["type"] == "Trade":
@@ -248,7 +528,13 @@ class Exchange(OrderBook):
 					))
 		dump_file.close()
 
-	def orders_dump(self, file_name, file_mode):
+	def orders_dump(self, file_name, file_mode, file_format="text"):
+		"""
+		Write the submitted orders, file_format as for tape_dump
+		"""
+		if file_format != "text":
+			event_io.save_event_log(self.all_orders_for_record, file_name, file_format)
+			return
 		dump_file = open(file_name, file_mode)
 		for order in self.all_orders_for_record:
 			dump_file.write("time: {}, order_type: {}, trade_id: {}, price: {}, quantity: {}, quote_id: {}\n".format(
@@ -261,5 +547,24 @@ class Exchange(OrderBook):
 			))
 		dump_file.close()
 
+	def run_dump(self, directory, file_format="npz"):
+		"""
+		Write the data of a run for later, offline analysis (see analysis.py):
+		the per-tick series to series.npz, and every event log in a binary file_format.
+		With retention on, these cover the values still in memory, see retain;
+		<name>_start in series.npz holds the index of the first value of each series.
+		:param directory: directory to write into, created if needed
+		:param file_format: one of event_io.FILE_FORMATS
+		"""
+		if not os.path.exists(directory):
+			os.makedirs(directory)
+		series = dict()
+		for name, (values, dtype) in self.series().items():
+			series[name + "_start"], series[name] = held_values(values, dtype)
+		np.savez(os.path.join(directory, "series.npz"), init_price=self.init_price, **series)
+		suffix = "" if file_format == "npy" else "." + file_format
+		for name, event_log in self.event_logs().items():
+			event_io.save_event_log(event_log, os.path.join(directory, name + suffix), file_format)
+
 	def __str__(self):
 		return "exchange"
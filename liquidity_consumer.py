@@ -1,11 +1,10 @@
 from trader import Trader
-import random
 import sys
 
 
 class LiquidityConsumer(Trader):
-	def __init__(self):
-		super(LiquidityConsumer, self).__init__()
+	def __init__(self, seed=None):
+		super(LiquidityConsumer, self).__init__(seed)
 		self.trader_id = "liquidity consumer"
 		# buy or sell
 		self.buy_or_sell = None
@@ -13,30 +12,47 @@ class LiquidityConsumer(Trader):
 		self.h_max = 100000
 		self.h_t = None
 		self.delta_lc = 0.10
+		# number of opposite price levels the agent takes volume from in a period, 1 is the best price only
+		self.depth_levels = 1
 
 	def make_decision(self):
-		if random.random() < 0.5:
+		if self.stream.random() < 0.5:
 			self.buy_or_sell = "buy"
 		else:
 			self.buy_or_sell = "sell"
-		self.h_t = random.randint(self.h_min, self.h_max)
+		self.h_t = self.stream.randint(self.h_min, self.h_max)
 
-	def work(self, exchange, cur_time):
+	def open_session(self, session, start_time):
+		"""
+		a new large order every day
+		"""
+		super(LiquidityConsumer, self).open_session(session, start_time)
+		self.make_decision()
+
+	@property
+	def activation_prob(self):
+		return self.delta_lc
+
+	def act(self, exchange, cur_time):
+		"""
+		Trade part of the large order, when activated with probability delta_lc
+		:param exchange: the instance of Exchange Class
+		:param cur_time: current time
+		:return: the order to be submitted
+		"""
 		order = None
-		# look at the current volume available at the opposite best price, phi_t
+		# look at the current volume available at the opposite best price levels, phi_t
 		if self.buy_or_sell == "buy":
-			if len(exchange.asks.lob_anon) == 0:
-				return None
-			phi_t = exchange.asks.lob_anon[0][1]
-			best_price = exchange.asks.lob_anon[0][0]
+			opposite_type = "Ask"
 		elif self.buy_or_sell == "sell":
-			if len(exchange.bids.lob_anon) == 0:
-				return None
-			phi_t = exchange.bids.lob_anon[-1][1]
-			best_price = exchange.bids.lob_anon[-1][0]
+			opposite_type = "Bid"
 		else:
 			sys.exit("[Error] bad self.buy_or_sell value.")
-		if random.random() < self.delta_lc and self.h_t > 0:
+		levels = exchange.market_data.top_levels(opposite_type, self.depth_levels)
+		if not levels:
+			return None
+		phi_t = sum(quantity for price, quantity in levels)
+		if self.h_t > 0:
 			"""
 			If the remaining volume of trader's large order, self.h_t, is less than phi_t, the agent 
 			sets this periods volume to v_t = self.h_t, otherwise he takes all available volume at 
@@ -46,6 +62,8 @@ class LiquidityConsumer(Trader):
 				v_t = self.h_t
 			else:
 				v_t = phi_t
+			# the worst of the levels needed for v_t, the best price when depth_levels is 1
+			best_price = exchange.market_data.price_to_fill(opposite_type, v_t)
 			if self.buy_or_sell == "buy":
 				order = self.buy(best_price, v_t, cur_time)
 			elif self.buy_or_sell == "sell":
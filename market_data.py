@@ -0,0 +1,147 @@
+import sys
+
+
+class MarketDataView:
+	"""
+	Read-only market data of an exchange for the agents: top of book, spread, mid-quote and depth.
+	The values are cached and only recomputed when the book has changed, which the version
+	counters of the two book halves tell, so every agent acting in a period shares one computation.
+	A consumer can keep version and later check changed_since(version).
+	"""
+
+	def __init__(self, exchange):
+		"""
+		:param exchange: the instance of Exchange Class
+		"""
+		self.bids = exchange.bids
+		self.asks = exchange.asks
+		self.cached_version = -1
+		self.cached_snapshot_version = -1
+		self.book_snapshot = None
+		self._best_bid = None
+		self._best_ask = None
+		self._best_bid_quantity = None
+		self._best_ask_quantity = None
+		self._spread = None
+		self._mid_quote = None
+
+	@property
+	def version(self):
+		"""
+		number which grows whenever a price level of the book changes
+		"""
+		return self.bids.version + self.asks.version
+
+	def changed_since(self, version):
+		return self.version != version
+
+	def refresh(self):
+		version = self.bids.version + self.asks.version
+		if version == self.cached_version:
+			return
+		self.cached_version = version
+		bids = self.bids.lob_anon
+		asks = self.asks.lob_anon
+		self._best_bid = self.bids.best_price
+		self._best_ask = self.asks.best_price
+		self._best_bid_quantity = bids[-1][1] if bids else None
+		self._best_ask_quantity = asks[0][1] if asks else None
+		if self._best_bid is not None and self._best_ask is not None:
+			self._spread = round(self._best_ask - self._best_bid, 2)
+			self._mid_quote = round((self._best_ask + self._best_bid) / 2, 2)
+		else:
+			self._spread = None
+			self._mid_quote = None
+
+	@property
+	def best_bid(self):
+		self.refresh()
+		return self._best_bid
+
+	@property
+	def best_ask(self):
+		self.refresh()
+		return self._best_ask
+
+	@property
+	def best_bid_quantity(self):
+		"""
+		total quantity at the best bid price, None if there are no bids
+		"""
+		self.refresh()
+		return self._best_bid_quantity
+
+	@property
+	def best_ask_quantity(self):
+		"""
+		total quantity at the best ask price, None if there are no asks
+		"""
+		self.refresh()
+		return self._best_ask_quantity
+
+	@property
+	def spread(self):
+		"""
+		best ask minus best bid, None if a side of the book is empty
+		"""
+		self.refresh()
+		return self._spread
+
+	@property
+	def mid_quote(self):
+		"""
+		mid-point of the best bid and ask, rounded to cents, None if a side of the book is empty
+		"""
+		self.refresh()
+		return self._mid_quote
+
+	@property
+	def bid_depth(self):
+		"""
+		number of bid price levels
+		"""
+		return self.bids.lob_depth
+
+	@property
+	def ask_depth(self):
+		return self.asks.lob_depth
+
+	def half(self, order_type):
+		if order_type == "Bid":
+			return self.bids
+		if order_type == "Ask":
+			return self.asks
+		sys.exit("[Error] bad order_type value")
+
+	def top_levels(self, order_type, n):
+		"""
+		:param order_type: side of the book, "Bid" or "Ask"
+		:param n: number of levels
+		:return: list of the n best (price, quantity) levels of the side, from the best price outward
+		"""
+		return self.half(order_type).top_levels(n)
+
+	def cumulative_quantity(self, order_type, price):
+		"""
+		:return: total quantity on a side at price or better
+		"""
+		return self.half(order_type).cumulative_quantity(price)
+
+	def price_to_fill(self, order_type, quantity):
+		"""
+		:return: the limit price needed to fill quantity against a side, None if the side is too thin
+		"""
+		return self.half(order_type).price_to_fill(quantity)
+
+	def snapshot(self):
+		"""
+		:return: the anonymized book as tuples of (price, quantity) tuples, bids then asks,
+			sorted by price; copied only when the book has changed since the last snapshot
+		"""
+		version = self.version
+		if version != self.cached_snapshot_version:
+			self.cached_snapshot_version = version
+			self.book_snapshot = (
+				tuple(tuple(level) for level in self.bids.lob_anon),
+				tuple(tuple(level) for level in self.asks.lob_anon))
+		return self.book_snapshot
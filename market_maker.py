@@ -1,5 +1,4 @@
 from trader import Trader
-import random
 
 
 class MarketMaker(Trader):
@@ -8,17 +7,24 @@ class MarketMaker(Trader):
 	@author Jiale Ma
 	"""
 
-	def __init__(self):
-		super(MarketMaker, self).__init__()
+	def __init__(self, seed=None):
+		super(MarketMaker, self).__init__(seed)
 		self.trader_id = "market maker"
 		self.delta_mm = 0.10
 		self.quantity_min = 1
 		self.quantity_max = 200000
 		self.rolling_mean_window_size = 50
+		# orders quoted on the last activation, cancelled when re-quoting; kept across sessions on purpose:
+		# with the book carried over they still rest on it, and once it is cleared cancelling them does nothing
+		self.quotes = []
 
-	def work(self, exchange, cur_time):
+	@property
+	def activation_prob(self):
+		return self.delta_mm
+
+	def act(self, exchange, cur_time):
 		"""
-		The main logic of market maker agent
+		The main logic of market maker agent, when activated with probability delta_mm
 		Prepare orders to be sent to exchange
 		"""
 		ask_order = None
@@ -29,8 +35,8 @@ class MarketMaker(Trader):
 		The market maker is to provide market liquidity.
 		"""
 
-		best_bid_price = exchange.bids.best_price
-		best_ask_price = exchange.asks.best_price
+		best_bid_price = exchange.market_data.best_bid
+		best_ask_price = exchange.market_data.best_ask
 		# if best_bid_price is None:
 		# 	best_bid_price = exchange.price
 		# if best_ask_price is None:
@@ -39,51 +45,50 @@ class MarketMaker(Trader):
 		if best_bid_price is None or best_ask_price is None:
 			return None, None
 
-		# exchange_prices = exchange.all_deal_prices
-		exchange_prices = exchange.prices
 		# if the number of the dealt prices is not enough, the rolling-mean cannot be performed.
-		if len(exchange_prices) < 2:
+		if len(exchange.prices) < 2:
+			return None, None
+		quantity_large = self.stream.randint(self.quantity_min, self.quantity_max)
+		quantity_small = 1
+		next_order_type = self.predict_next_order(exchange.price_window(self.rolling_mean_window_size))
+		if next_order_type is not None:
+			self.cancel_quotes(exchange, cur_time)
+		if next_order_type == "buy":
+			ask_order = self.sell(best_ask_price, quantity_large, cur_time)
+			bid_order = self.buy(best_bid_price, quantity_small, cur_time)
+		elif next_order_type == "sell":
+			bid_order = self.buy(best_bid_price, quantity_large, cur_time)
+			ask_order = self.sell(best_ask_price, quantity_small, cur_time)
+		else:
 			return None, None
-		# market maker sent orders to exchange according to probability delta_mm
-		if random.random() < self.delta_mm:
-			quantity_large = random.randint(self.quantity_min, self.quantity_max)
-			quantity_small = 1
-			next_order_type = self.predict_next_order(exchange_prices)
-			if next_order_type == "buy":
-				ask_order = self.sell(best_ask_price, quantity_large, cur_time)
-				bid_order = self.buy(best_bid_price, quantity_small, cur_time)
-			elif next_order_type == "sell":
-				bid_order = self.buy(best_bid_price, quantity_large, cur_time)
-				ask_order = self.sell(best_ask_price, quantity_small, cur_time)
-			else:
-				return None, None
+		self.quotes = [ask_order, bid_order]
 		return ask_order, bid_order
 
-	def predict_next_order(self, exchange_prices):
+	def cancel_quotes(self, exchange, cur_time):
+		"""
+		Cancel the orders from the last quote that are still resting on the book
+		:param exchange: the instance of Exchange Class
+		:param cur_time: current time
+		"""
+		for order in self.quotes:
+			if order is not None:
+				exchange.del_order(cur_time, order)
+		self.quotes = []
+
+	def predict_next_order(self, price_window):
 		"""
-		Predict the type of next order, buy or sell.
-		If buy, return true. Otherwise, return false.
+		Predict the type of next order, buy or sell, from the move of the w-period rolling mean of price
+		over the last period.
+		:param price_window: the instance of RollingMean over the deal prices, see Exchange.price_window
+		:return: "buy", "sell", or None if the rolling mean did not move
 		"""
-		last_price = self.compute_rolling_mean(exchange_prices)
-		penultimate_price = self.compute_rolling_mean(exchange_prices[:-1])
+		trend = price_window.trend()
 		# price drop, the type of next order is sell
-		if last_price < penultimate_price:
+		if trend < 0:
 			return "sell"
-		elif last_price > penultimate_price:
+		elif trend > 0:
 			# price rise, the type of next order is buy
 			return "buy"
 		else:
 			return None
 
-	def compute_rolling_mean(self, exchange_prices):
-		"""
-		Compute w-period rolling mean of price
-		:param exchange_prices: prices
-		:return: the price after rolling mean
-		"""
-		if len(exchange_prices) < self.rolling_mean_window_size:
-			rolling_mean_price = sum(exchange_prices) / len(exchange_prices)
-		else:
-			rolling_mean_price = sum(exchange_prices[-self.rolling_mean_window_size:]) / self.rolling_mean_window_size
-		return rolling_mean_price
-
@@ -1,6 +1,5 @@
 from trader import Trader
-import random
-import numpy as np
+from rolling import RollingVariance
 
 
 class MeanReversionTrader(Trader):
@@ -8,8 +7,8 @@ class MeanReversionTrader(Trader):
 	The implementation of mean reversion trader in the agent-based model
 	@author Jiale Ma
 	"""
-	def __init__(self):
-		super(MeanReversionTrader, self).__init__()
+	def __init__(self, seed=None):
+		super(MeanReversionTrader, self).__init__(seed)
 		self.trader_id = "mean reversion trader"
 		self.delta_mr = 0.40
 		self.v_mr = 1
@@ -18,42 +17,51 @@ class MeanReversionTrader(Trader):
 		# this is an empirical value, given by author
 		self.k = 0.01
 		self.sigma_t = None
-		self.all_ema = []
+		# number of latest ema values in sigma_t
+		self.ema_window_size = 1000
+		# rolling variance of the latest ema values, created on the first activation;
+		# ema_t and the window are kept across sessions on purpose, as the prices run on from day to day
+		self.ema_window = None
+		# the instance of Logger, for debugging code
+		self.logger = None
 
-	def work(self, exchange, cur_time, logger):
+	@property
+	def activation_prob(self):
+		return self.delta_mr
+
+	def act(self, exchange, cur_time):
 		"""
-		The main logic of this agent.
+		The main logic of this agent, when activated with probability delta_mr.
 		:param exchange: the instance of Exchange Class
 		:param cur_time: current time
-		:param logger: the instance of Logger, for debugging code
 		:return: to be submitted order
 		"""
 		order = None
-		best_bid_price = exchange.bids.best_price
-		best_ask_price = exchange.asks.best_price
+		best_bid_price = exchange.market_data.best_bid
+		best_ask_price = exchange.market_data.best_ask
 		if len(exchange.prices) == 0:
 			return None
-		if random.random() < self.delta_mr:
-			self.compute_ema(exchange)
-			# sell
-			if exchange.price - self.ema_t >= self.k * self.sigma_t:
-				if best_ask_price is None:
-					return None
-				ask_price = best_ask_price - exchange.tick_size
-				order = self.sell(ask_price, self.v_mr, cur_time)
-			elif self.ema_t - exchange.price >= self.k * self.sigma_t:
-				# buy
-				if best_bid_price is None:
-					return None
-				bid_price = best_bid_price + exchange.tick_size
-				order = self.buy(bid_price, self.v_mr, cur_time)
-			logger.debug(order)
+		self.compute_ema(exchange)
+		# sell
+		if exchange.price - self.ema_t >= self.k * self.sigma_t:
+			if best_ask_price is None:
+				return None
+			ask_price = best_ask_price - exchange.tick_size
+			order = self.sell(ask_price, self.v_mr, cur_time)
+		elif self.ema_t - exchange.price >= self.k * self.sigma_t:
+			# buy
+			if best_bid_price is None:
+				return None
+			bid_price = best_bid_price + exchange.tick_size
+			order = self.buy(bid_price, self.v_mr, cur_time)
+		if self.logger is not None:
+			self.logger.debug(order)
 		return order
 
 	def compute_ema(self, exchange):
 		"""
 		compute the exponential moving average of the asset price, ema_t, and
-		the standard deviation of all ema.
+		the standard deviation of the latest ema_window_size ema values, in constant time.
 		@param exchange: exchange
 		@return: None
 		"""
@@ -67,8 +75,8 @@ class MeanReversionTrader(Trader):
 
 		price_t = exchange.price
 		self.ema_t = self.ema_t + self.alpha * (price_t - self.ema_t)
-		self.all_ema.append(self.ema_t)
-		if len(self.all_ema) > 1000:
-			self.sigma_t = np.std(self.all_ema[-1000:], ddof=1)
-		else:
-			self.sigma_t = np.std(self.all_ema, ddof=1)
+		if self.ema_window is None:
+			self.ema_window = RollingVariance(self.ema_window_size)
+		self.ema_window.append(self.ema_t)
+		# nan until there are two values, so the first activation places no order
+		self.sigma_t = self.ema_window.std()
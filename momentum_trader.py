@@ -1,5 +1,4 @@
 from trader import Trader
-import random
 
 
 class MomentumTrader(Trader):
@@ -7,17 +6,21 @@ class MomentumTrader(Trader):
 	The implementation of momentum trader in the agent-based model.
 	@author Jiale Ma
 	"""
-	def __init__(self):
-		super(MomentumTrader, self).__init__()
+	def __init__(self, seed=None):
+		super(MomentumTrader, self).__init__(seed)
 		self.trader_id = "momentum trader"
 		self.delta_mt = 0.40
 		self.n_r = 6
 		self.k = 0.001
 		self.wealth = 100000
 
-	def work(self, exchange, cur_time):
+	@property
+	def activation_prob(self):
+		return self.delta_mt
+
+	def act(self, exchange, cur_time):
 		"""
-		The trading logic of momentum traders
+		The trading logic of momentum traders, when activated with probability delta_mt
 		:param exchange: the instance of Exchange Class
 		:param cur_time: current time
 		:return: the order to be submitted
@@ -25,12 +28,11 @@ class MomentumTrader(Trader):
 		order = None
 		if len(exchange.prices) < self.n_r:
 			return None
-		if random.random() < self.delta_mt:
-			roc_t = (exchange.prices[-1] - exchange.prices[-self.n_r]) \
-					/ exchange.prices[-self.n_r]
-			v_t = int(abs(roc_t) * self.wealth + 0.5)
-			if roc_t >= self.k:
-				order = self.buy(exchange.asks.best_price, v_t, cur_time)
-			elif roc_t <= -self.k:
-				order = self.sell(exchange.bids.best_price, v_t, cur_time)
+		roc_t = (exchange.prices[-1] - exchange.prices[-self.n_r]) \
+				/ exchange.prices[-self.n_r]
+		v_t = int(abs(roc_t) * self.wealth + 0.5)
+		if roc_t >= self.k:
+			order = self.buy(exchange.market_data.best_ask, v_t, cur_time)
+		elif roc_t <= -self.k:
+			order = self.sell(exchange.market_data.best_bid, v_t, cur_time)
 		return order
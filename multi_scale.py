@@ -0,0 +1,75 @@
+import os
+import numpy as np
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+# log prices shared with the worker processes of map_scales
+worker_log_prices = None
+worker_memory = None
+
+
+def log_prices(prices):
+	"""
+	:param prices: price series
+	:return: numpy array of the log prices
+	"""
+	return np.log(np.asarray(prices, dtype=np.float64))
+
+
+def scale_returns(log_price, time_scale):
+	"""
+	Log returns over a time scale, log(p[i + time_scale] / p[i]) for every i, as one array slice difference.
+	:param log_price: numpy array of log prices
+	:param time_scale: horizon of the returns, in periods
+	:return: numpy array of len(log_price) - time_scale returns
+	"""
+	return log_price[time_scale:] - log_price[:len(log_price) - time_scale]
+
+
+def attach_log_prices(memory_name, length):
+	global worker_log_prices, worker_memory
+	worker_memory = shared_memory.SharedMemory(name=memory_name)
+	worker_log_prices = np.ndarray((length,), dtype=np.float64, buffer=worker_memory.buf)
+
+
+def apply_at_scale(function, time_scale):
+	return function(scale_returns(worker_log_prices, time_scale), time_scale)
+
+
+def map_scales(function, prices, time_scales, processes=None):
+	"""
+	Compute a statistic of the log returns at each time scale.
+	With more than one process, the scales are spread over a process pool,
+	and the workers read the log prices from shared memory instead of receiving copies.
+	:param function: module level function(returns, time_scale) -> statistic
+	:param prices: price series
+	:param time_scales: list of horizons, in periods
+	:param processes: number of worker processes, all cpus if None, no pool if 1
+	:return: list of the statistic at each time scale
+	"""
+	log_price = log_prices(prices)
+	time_scales = list(time_scales)
+	if processes is None:
+		processes = os.cpu_count() or 1
+	processes = min(processes, len(time_scales))
+	if processes <= 1:
+		return [function(scale_returns(log_price, time_scale), time_scale) for time_scale in time_scales]
+
+	memory = shared_memory.SharedMemory(create=True, size=max(log_price.nbytes, 1))
+	try:
+		shared_log_price = np.ndarray(log_price.shape, dtype=np.float64, buffer=memory.buf)
+		shared_log_price[:] = log_price
+		with ProcessPoolExecutor(
+				max_workers=processes,
+				initializer=attach_log_prices,
+				initargs=(memory.name, len(log_price))) as executor:
+			results = list(executor.map(
+				apply_at_scale,
+				[function] * len(time_scales),
+				time_scales,
+				chunksize=max(1, len(time_scales) // (4 * processes))))
+		del shared_log_price
+	finally:
+		memory.close()
+		memory.unlink()
+	return results
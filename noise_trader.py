@@ -1,6 +1,5 @@
 import sys
 from trader import Trader
-import random
 import math
 
 
@@ -9,8 +8,8 @@ class NoiseTrader(Trader):
 	The implementation of noise trader.
 	@author Jiale Ma
 	"""
-	def __init__(self):
-		super(NoiseTrader, self).__init__()
+	def __init__(self, seed=None):
+		super(NoiseTrader, self).__init__(seed)
 		self.trader_id = "noise trader"
 		self.delta_nt = 0.75
 		self.buy_or_sell_prob = 0.50
@@ -20,6 +19,8 @@ class NoiseTrader(Trader):
 		self.alpha_l = 0.54
 		# cancel order probability
 		self.alpha_c = 0.43
+		# "all" cancels every resting order of the trader on the side, "oldest" only its oldest one
+		self.cancel_policy = "all"
 		# market order size
 		self.mu_mo = 7
 		self.sigma_mo = 0.1
@@ -38,66 +39,74 @@ class NoiseTrader(Trader):
 		# off-spread limit order
 		self.alpha_off_spr = 0.426
 
-	def work(self, exchange, cur_time):
+	@property
+	def activation_prob(self):
+		return self.delta_nt
+
+	def act(self, exchange, cur_time):
 		"""
-		The main logic of noise traders
+		The main logic of noise traders, when activated with probability delta_nt
 		:param exchange: the instance of Exchange Class
 		:param cur_time: current time
 		:return: the order to be submitted
 		"""
 		order = None
-		if random.random() < self.delta_nt:
-			if random.random() <= self.buy_or_sell_prob:
-				buy_or_sell = "buy"
-			else:
-				buy_or_sell = "sell"
+		draw = self.stream.random
+		if draw() <= self.buy_or_sell_prob:
+			buy_or_sell = "buy"
+		else:
+			buy_or_sell = "sell"
 
-			best_bid_price = exchange.bids.best_price
-			best_ask_price = exchange.asks.best_price
-			if best_bid_price is None:
-				best_bid_price = exchange.price
-			if best_ask_price is None:
-				best_ask_price = exchange.price
+		best_bid_price = exchange.market_data.best_bid
+		best_ask_price = exchange.market_data.best_ask
+		if best_bid_price is None:
+			best_bid_price = exchange.price
+		if best_ask_price is None:
+			best_ask_price = exchange.price
 
-			random_action_prob = random.random()
-			# submit market order
-			if random_action_prob < self.alpha_m:
-				q_t = int(math.exp(self.mu_mo + self.sigma_mo * random.random()) + 0.5)
-				order = self.submit_order(buy_or_sell, q_t, None, "submit market order", exchange, cur_time)
-			elif random_action_prob < self.alpha_m + self.alpha_l:
-				# submit limit order
-				random_limit_order_prob = random.random()
-				q_t = int(math.exp(self.mu_lo + self.sigma_lo * random.random()) + 0.5)
-				# cross limit order
-				if random_limit_order_prob < self.alpha_crs:
-					order = self.submit_order(buy_or_sell, q_t, None, "cross limit order", exchange, cur_time)
-				elif random_limit_order_prob < self.alpha_crs + self.alpha_in_spr:
-					# inside spread limit order
-					price_in_spr = random.uniform(best_bid_price, best_ask_price)
-					order = self.submit_order(buy_or_sell, q_t, price_in_spr, "", exchange, cur_time)
-				elif random_limit_order_prob < self.alpha_crs + self.alpha_in_spr + self.alpha_spr:
-					# spread limit order
-					order = self.submit_order(buy_or_sell, q_t, None, "spread limit order", exchange, cur_time)
-				else:
-					# off-spread limit order
-					price_off_spr = self.x_min_off_spr * (1 - random.uniform(0, 1)) ** (-1 / (self.beta_off_spr - 1))
-					price_off_spr = min(price_off_spr, 0.2)
-					order = self.submit_order(buy_or_sell, q_t, price_off_spr, "off-spread limit order", exchange, cur_time)
+		random_action_prob = draw()
+		# submit market order
+		if random_action_prob < self.alpha_m:
+			q_t = int(math.exp(self.mu_mo + self.sigma_mo * draw()) + 0.5)
+			order = self.submit_order(buy_or_sell, q_t, None, "submit market order", exchange, cur_time)
+		elif random_action_prob < self.alpha_m + self.alpha_l:
+			# submit limit order
+			random_limit_order_prob = draw()
+			q_t = int(math.exp(self.mu_lo + self.sigma_lo * draw()) + 0.5)
+			# cross limit order
+			if random_limit_order_prob < self.alpha_crs:
+				order = self.submit_order(buy_or_sell, q_t, None, "cross limit order", exchange, cur_time)
+			elif random_limit_order_prob < self.alpha_crs + self.alpha_in_spr:
+				# inside spread limit order
+				price_in_spr = self.stream.uniform(best_bid_price, best_ask_price)
+				order = self.submit_order(buy_or_sell, q_t, price_in_spr, "", exchange, cur_time)
+			elif random_limit_order_prob < self.alpha_crs + self.alpha_in_spr + self.alpha_spr:
+				# spread limit order
+				order = self.submit_order(buy_or_sell, q_t, None, "spread limit order", exchange, cur_time)
 			else:
-				# cancel limit order
-				if buy_or_sell == "buy":
-					order_type = "Bid"
-				else:
-					order_type = "Ask"
-				# exchange.del_oldest_order(self.trader_id, order_type, cur_time)
+				# off-spread limit order
+				price_off_spr = self.x_min_off_spr * (1 - draw()) ** (-1 / (self.beta_off_spr - 1))
+				price_off_spr = min(price_off_spr, 0.2)
+				order = self.submit_order(buy_or_sell, q_t, price_off_spr, "off-spread limit order", exchange, cur_time)
+		else:
+			# cancel limit order
+			if buy_or_sell == "buy":
+				order_type = "Bid"
+			else:
+				order_type = "Ask"
+			if self.cancel_policy == "all":
 				exchange.del_trader_all_orders(self.trader_id, [order_type], cur_time)
+			elif self.cancel_policy == "oldest":
+				exchange.del_oldest_order(self.trader_id, order_type, cur_time)
+			else:
+				sys.exit("[Error] bad cancel_policy value")
 		return order
 
 	def submit_order(self, buy_or_sell=None, q_t=None, price=None, action_type="", exchange=None, cur_time=None):
 		if q_t == 0:
 			sys.exit("[Error] bad q_t value")
-		best_bid_price = exchange.bids.best_price
-		best_ask_price = exchange.asks.best_price
+		best_bid_price = exchange.market_data.best_bid
+		best_ask_price = exchange.market_data.best_ask
 		if best_bid_price is None:
 			best_bid_price = exchange.price
 		if best_ask_price is None:
@@ -1,7 +1,12 @@
+from collections import namedtuple
+
+
 class Order:
 	"""
 	@author Jiale Ma
 	"""
+	# no per-instance __dict__: resting orders are stored directly in the lob queues
+	__slots__ = ('trader_id', 'order_type', 'price', 'quantity', 'time', 'quote_id')
 
 	def __init__(self, trader_id="", order_type="", price=None, quantity=None, time="", quote_id=0):
 		# trader i.d.
@@ -20,3 +25,15 @@ class Order:
 	def __str__(self):
 		return "[%s %s P=%.3f Q=%s T=%5.2f quote_id:%d]" % (
 			self.trader_id, self.order_type, self.price, self.quantity, self.time, self.quote_id)
+
+
+class OrderEvent(namedtuple('OrderEvent', ['time', 'order_type', 'trader_id', 'price', 'quantity', 'quote_id'])):
+	"""
+	Immutable record of an order, captured once when it is submitted to the exchange.
+	Unlike the Order itself, it is not changed by later fills or cancels.
+	"""
+	__slots__ = ()
+
+	@classmethod
+	def from_order(cls, order):
+		return cls(order.time, order.order_type, order.trader_id, order.price, order.quantity, order.quote_id)
@@ -1,9 +1,20 @@
 from order_book_half import OrderBookHalf
+from event_log import EventLog, Interner
 
 # minimum price in the system, in cents/pennies
 BSE_SYS_MIN_PRICE = 1
 # maximum price in the system, in cents/pennies
 BSE_SYS_MAX_PRICE = 1000
+# columns of the tape, shared by trade and cancel records
+TAPE_FIELDS = [
+	('type', 'str'),
+	('time', 'int'),
+	('price', 'float'),
+	('quantity', 'int'),
+	('bid', 'str'),
+	('ask', 'str'),
+	('trader_id', 'str'),
+	('quote_id', 'int')]
 
 
 class OrderBook:
@@ -11,7 +22,9 @@ class OrderBook:
 	def __init__(self):
 		self.bids = OrderBookHalf('Bid', BSE_SYS_MIN_PRICE)
 		self.asks = OrderBookHalf('Ask', BSE_SYS_MAX_PRICE)
-		self.tape = []
+		# trader ids and record types interned to small ints, shared by all event logs
+		self.interner = Interner()
+		self.tape = EventLog(TAPE_FIELDS, self.interner)
 		# unique ID code for each quote accepted onto the book. count from 0
 		self.quote_id = 0
 
@@ -1,3 +1,7 @@
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+
 class OrderBookHalf:
 	"""
 	@author Jiale Ma
@@ -6,12 +10,16 @@ class OrderBookHalf:
 	def __init__(self, book_type, worst_price):
 		# book type: bids or asks?
 		self.book_type = book_type
-		# dictionary of orders received, indexed by Trader ID
+		# dictionary of resting orders, indexed by Trader ID, each an insertion-ordered dict of quote i.d. -> order
 		self.orders = {}
-		# limit order book, dictionary indexed by price, with order info
+		# index of resting orders, quote i.d. -> order
+		self.quotes = {}
+		# limit order book, dictionary indexed by price, with [total quantity, FIFO queue of orders]
 		self.lob = {}
-		# anonymized LOB, lists, with only price/quantity info
+		# anonymized LOB, lists, with only price/quantity info, sorted by price
 		self.lob_anon = []
+		# sorted prices of the levels on the lob, kept in step with lob_anon
+		self.price_index = []
 		# summary stats
 		self.best_price = None
 		self.best_trader_id = None
@@ -20,14 +28,18 @@ class OrderBookHalf:
 		self.session_extreme = None  # most extreme price quoted in this session
 		self.number_traders = 0  # how many orders?
 		self.lob_depth = 0  # how many different prices on lob?
+		# counts the changes of the price levels, see market_data.MarketDataView
+		self.version = 0
 
 	def anonymize_lob(self):
 		"""
 		anonymize a lob, strip out order details, format as a sorted list
 		NB for asks, the sorting should be reversed
 		"""
+		self.version += 1
+		self.price_index = sorted(self.lob)
 		self.lob_anon = []
-		for price in sorted(self.lob):
+		for price in self.price_index:
 			quantity = self.lob[price][0]
 			self.lob_anon.append([price, quantity])
 
@@ -35,61 +47,161 @@ class OrderBookHalf:
 		"""
 		take a list of orders and build a limit-order-book (lob) from it
 		NB the exchange needs to know arrival times and trader-id associated with each order
-		returns lob as a dictionary (i.e., unsorted)
-		also builds anonymized version (just price/quantity, sorted, as a list) for publishing to traders
+		the book is maintained incrementally by book_add/order_del/delete_best,
+		so a full rebuild is only needed if self.orders has been edited directly
 		"""
-		self.lob = {}
+		all_orders = []
 		for trader_id in self.orders:
-			orders_by_trader = self.orders.get(trader_id)
-			for order in orders_by_trader:
-				if order.price in self.lob:
-					# update existing entry
-					quantity = self.lob[order.price][0]
-					order_list = self.lob[order.price][1]
-					order_list.append([order.time, order.quantity, order.trader_id, order.quote_id])
-					self.lob[order.price] = [quantity + order.quantity, order_list]
-				else:
-					self.lob[order.price] = [order.quantity, [[order.time, order.quantity, order.trader_id, order.quote_id]]]
-
+			all_orders.extend(self.orders[trader_id].values())
+		# restore time priority inside each price level
+		all_orders.sort(key=lambda order: order.quote_id)
+		self.lob = {}
+		self.quotes = {}
+		for order in all_orders:
+			self.quotes[order.quote_id] = order
+			if order.price in self.lob:
+				level = self.lob[order.price]
+				level[0] += order.quantity
+				level[1].append(order)
+			else:
+				self.lob[order.price] = [order.quantity, deque([order])]
 		# create anonymized version
 		self.anonymize_lob()
-		# record best price and associated trader-id
-		if len(self.lob) > 0:
+		self.update_best()
+
+	def update_best(self):
+		"""
+		record best price and associated trader-id, following the time priority principle
+		"""
+		self.lob_depth = len(self.price_index)
+		if self.lob_depth > 0:
 			if self.book_type == 'Bid':
-				self.best_price = self.lob_anon[-1][0]
+				self.best_price = self.price_index[-1]
 			else:
-				self.best_price = self.lob_anon[0][0]
-			# time priority principle
-			self.best_trader_id = self.lob[self.best_price][1][0][2]
-			self.best_quantity = self.lob[self.best_price][1][0][1]
+				self.best_price = self.price_index[0]
+			first_order = self.lob[self.best_price][1][0]
+			self.best_trader_id = first_order.trader_id
+			self.best_quantity = first_order.quantity
 		else:
 			self.best_price = None
 			self.best_trader_id = None
 			self.best_quantity = None
 
-	def book_add(self, order):
+	def top_levels(self, n):
+		"""
+		the n best price levels, from the best price outward
+		:return: list of (price, quantity) tuples, shorter if the book has fewer levels
+		"""
+		if self.book_type == 'Bid':
+			levels = self.lob_anon[:-n - 1:-1] if n > 0 else []
+		else:
+			levels = self.lob_anon[:n]
+		return [(price, quantity) for price, quantity in levels]
+
+	def cumulative_quantity(self, price):
+		"""
+		total quantity resting at prices as good as price or better, i.e. what an incoming order
+		with this limit price could fill against
+		"""
+		if self.book_type == 'Bid':
+			levels = self.lob_anon[bisect_left(self.price_index, price):]
+		else:
+			levels = self.lob_anon[:bisect_right(self.price_index, price)]
+		return sum(level[1] for level in levels)
+
+	def price_to_fill(self, quantity):
+		"""
+		the limit price an incoming order needs to fill quantity against this side, walking from the best price outward
+		:return: the price of the last level needed, or None if the side holds less than quantity
+		"""
+		lob_anon = self.lob_anon
+		depth = len(lob_anon)
+		for i in range(depth):
+			price, level_quantity = lob_anon[depth - 1 - i] if self.book_type == 'Bid' else lob_anon[i]
+			quantity -= level_quantity
+			if quantity <= 0:
+				return price
+		return None
+
+	def level_add(self, order):
+		"""
+		append an order to the back of the queue at its price level, creating the level if needed
+		"""
+		self.version += 1
+		self.quotes[order.quote_id] = order
+		level = self.lob.get(order.price)
+		if level is None:
+			self.lob[order.price] = [order.quantity, deque([order])]
+			position = bisect_left(self.price_index, order.price)
+			self.price_index.insert(position, order.price)
+			self.lob_anon.insert(position, [order.price, order.quantity])
+		else:
+			level[0] += order.quantity
+			level[1].append(order)
+			self.lob_anon[bisect_left(self.price_index, order.price)][1] += order.quantity
+
+	def level_reduce(self, price, quantity):
+		"""
+		reduce the total quantity of a price level, dropping the level once it is empty
+		cancelled orders are left in the queue and skipped once they reach its head
+		"""
+		self.version += 1
+		level = self.lob[price]
+		level[0] -= quantity
+		position = bisect_left(self.price_index, price)
+		if level[0] == 0:
+			del self.lob[price]
+			del self.price_index[position]
+			del self.lob_anon[position]
+		else:
+			queue = level[1]
+			while queue[0].quote_id not in self.quotes:
+				queue.popleft()
+			self.lob_anon[position][1] = level[0]
+
+	def unlink_order(self, order):
+		"""
+		drop an order from the quote index and from its trader's orders
+		if it is still queued on its level, it is then treated as cancelled
+		"""
+		del self.quotes[order.quote_id]
+		orders_by_trader = self.orders[order.trader_id]
+		del orders_by_trader[order.quote_id]
+		if len(orders_by_trader) == 0:
+			del self.orders[order.trader_id]
+			self.number_traders = len(self.orders)
+
+	def remove_order(self, quote_id):
+		"""
+		take a resting order off the book, without refreshing the best price
+		"""
+		order = self.quotes[quote_id]
+		self.unlink_order(order)
+		self.level_reduce(order.price, order.quantity)
+		return order
+
+	def record_quote(self, order):
+		"""
+		if this is an ask, does the price set a new extreme-high record?
 		"""
-		add order to the dictionary holding the list of orders
-		either overwrites old order from this trader
-		or dynamically creates new entry in the dictionary
-		so, max of one order per trader per list
-		checks whether length or order list has changed, to distinguish addition/overwrite
-		"""
-		# if this is an ask, does the price set a new extreme-high record?
-		# print(order.price, order.quantity, order.time)
-		# print()
-		# if self.session_extreme is None or order.price > self.session_extreme:
-		# 	self.session_extreme = order.price
 		if (self.book_type == 'Ask') and ((self.session_extreme is None) or (order.price > self.session_extreme)):
 			self.session_extreme = order.price
 
+	def book_add(self, order):
+		"""
+		add order to the dictionary holding the orders of each trader
+		a trader may hold several resting orders, kept in arrival order
+		checks whether the number of traders has changed, to distinguish addition/overwrite
+		"""
+		self.record_quote(order)
 		number_traders = self.number_traders
 		if order.trader_id in self.orders:
-			self.orders[order.trader_id].append(order)
+			self.orders[order.trader_id][order.quote_id] = order
 		else:
-			self.orders[order.trader_id] = [order]
+			self.orders[order.trader_id] = {order.quote_id: order}
 		self.number_traders = len(self.orders)
-		self.build_lob()
+		self.level_add(order)
+		self.update_best()
 		if number_traders != self.number_traders:
 			return 'Addition'
 		else:
@@ -97,41 +209,177 @@ class OrderBookHalf:
 
 	def book_del(self, trader_id):
 		"""
-		delete order from the dictionary holding the orders
-		assumes max of one order per trader per list
+		delete all orders of a trader from the book
 		checks that the Trader ID does actually exist in the dict before deletion
 		"""
 		if self.orders.get(trader_id) is not None:
-			del (self.orders[trader_id])
-			self.number_traders = len(self.orders)
-			self.build_lob()
+			for quote_id in list(self.orders[trader_id]):
+				self.remove_order(quote_id)
+			self.update_best()
 
 	def oldest_order_del(self, trader_id):
+		"""
+		delete the earliest resting order of a trader
+		"""
 		if self.orders.get(trader_id) is not None:
-			if len(self.orders[trader_id]) == 1:
-				del (self.orders[trader_id])
-			else:
-				del (self.orders[trader_id][0])
-			self.build_lob()
+			self.remove_order(next(iter(self.orders[trader_id])))
+			self.update_best()
+
+	def order_del(self, quote_id):
+		"""
+		delete a single resting order by its quote i.d.
+		:return: the deleted order, or None if it is no longer on the book
+		"""
+		if quote_id not in self.quotes:
+			return None
+		order = self.remove_order(quote_id)
+		self.update_best()
+		return order
+
+	def order_reduce(self, quote_id, quantity):
+		"""
+		reduce the quantity of a resting order, keeping its time priority
+		the order is deleted if the reduction covers its remaining quantity
+		:return: the reduced order, or None if it is no longer on the book
+		"""
+		if quote_id not in self.quotes:
+			return None
+		order = self.quotes[quote_id]
+		if quantity >= order.quantity:
+			return self.order_del(quote_id)
+		order.quantity -= quantity
+		self.level_reduce(order.price, quantity)
+		self.update_best()
+		return order
 
 	def delete_best(self, quantity):
 		"""
 		delete order: when the best bid/ask has been hit, delete it from the book
-		the Trader ID of the deleted order is return-value, as counterparty to the trade
+		the arrival time of the deleted order is return-value
 		"""
-		best_price_orders = self.lob[self.best_price]
+		best_price = self.best_price
+		queue = self.lob[best_price][1]
 		# time priority principle, here the 0 means the first order to arrive
-		best_price_trader_id = best_price_orders[1][0][2]
-		best_price_order_time = best_price_orders[1][0][0]
-		for order in self.orders[best_price_trader_id]:
-			# find the order to be deleted according to the time
-			if order.time == best_price_order_time:
-				order.quantity -= quantity
-				if order.quantity == 0:
-					if len(self.orders[best_price_trader_id]) == 1:
-						del self.orders[best_price_trader_id]
-					else:
-						self.orders[best_price_trader_id].remove(order)
-		self.build_lob()
+		order = queue[0]
+		best_price_order_time = order.time
+		order.quantity -= quantity
+		if order.quantity == 0:
+			queue.popleft()
+			self.unlink_order(order)
+		self.level_reduce(best_price, quantity)
+		self.update_best()
 		return best_price_order_time
 
+	def check_invariants(self):
+		"""
+		Check that the incremental structures agree with the resting orders, see book_check.py:
+		the quote index and the orders by trader hold the same orders, every live order is queued
+		on its level in arrival order, the level totals, price index and anonymized book match,
+		and the best price and best order are up to date.
+		:return: list of the broken invariants, empty if the half is consistent
+		"""
+		problems = []
+		by_trader = dict()
+		for trader_id, orders in self.orders.items():
+			if not orders:
+				problems.append("{} has an empty order dict".format(trader_id))
+			for quote_id, order in orders.items():
+				if order.quote_id != quote_id or order.trader_id != trader_id:
+					problems.append("order {} is filed under the wrong key".format(quote_id))
+				by_trader[quote_id] = order
+		if by_trader.keys() != self.quotes.keys():
+			problems.append("quote index and orders by trader differ")
+		if self.number_traders != len(self.orders):
+			problems.append("number_traders is {}, {} traders rest".format(self.number_traders, len(self.orders)))
+		queued = dict()
+		for price, (total, queue) in self.lob.items():
+			live = [order for order in queue if self.quotes.get(order.quote_id) is order]
+			if not live:
+				problems.append("level {} has no live orders".format(price))
+				continue
+			if self.quotes.get(queue[0].quote_id) is not queue[0]:
+				problems.append("level {} starts with a cancelled order".format(price))
+			if [order.quote_id for order in live] != sorted(order.quote_id for order in live):
+				problems.append("level {} is out of time priority".format(price))
+			if total != sum(order.quantity for order in live):
+				problems.append("level {} total {} differs from its orders".format(price, total))
+			for order in live:
+				if order.price != price or order.quantity <= 0:
+					problems.append("order {} is queued on level {}".format(order.quote_id, price))
+				queued[order.quote_id] = order
+		if queued.keys() != self.quotes.keys():
+			problems.append("queued orders and quote index differ")
+		if self.price_index != sorted(self.lob):
+			problems.append("price index differs from the levels")
+		if self.lob_anon != [[price, self.lob[price][0]] for price in self.price_index if price in self.lob]:
+			problems.append("anonymized book differs from the levels")
+		if self.lob_depth != len(self.price_index):
+			problems.append("lob_depth is {}, {} levels rest".format(self.lob_depth, len(self.price_index)))
+		if self.price_index:
+			best_price = self.price_index[-1] if self.book_type == 'Bid' else self.price_index[0]
+			first_order = self.lob[best_price][1][0] if best_price in self.lob else None
+			if self.best_price != best_price:
+				problems.append("best price is {}, {} expected".format(self.best_price, best_price))
+			elif first_order is not None and (
+					self.best_trader_id != first_order.trader_id or self.best_quantity != first_order.quantity):
+				problems.append("best order is out of date")
+		elif self.best_price is not None:
+			problems.append("best price {} on an empty book".format(self.best_price))
+		return problems
+
+	def sweep(self, limit_price, quantity):
+		"""
+		fill an incoming order against this side of the book, level by level from the best price,
+		while the level price is at least as good as limit_price for the incoming order
+		fully consumed levels are dropped together and the best price is refreshed once at the end
+		:param limit_price: price limit of the incoming order
+		:param quantity: quantity of the incoming order
+		:return: list of fills, each (price, quantity, trader_id, order_time) of a resting order
+		"""
+		fills = []
+		price_index = self.price_index
+		depth = len(price_index)
+		cleared = 0
+		while quantity > 0 and cleared < depth:
+			if self.book_type == 'Bid':
+				price = price_index[depth - 1 - cleared]
+				if price < limit_price:
+					break
+			else:
+				price = price_index[cleared]
+				if price > limit_price:
+					break
+			level = self.lob[price]
+			queue = level[1]
+			while quantity > 0 and level[0] > 0:
+				order = queue[0]
+				if order.quote_id not in self.quotes:
+					queue.popleft()
+					continue
+				fill_quantity = min(order.quantity, quantity)
+				order.quantity -= fill_quantity
+				level[0] -= fill_quantity
+				quantity -= fill_quantity
+				fills.append((price, fill_quantity, order.trader_id, order.time))
+				if order.quantity == 0:
+					queue.popleft()
+					self.unlink_order(order)
+			if level[0] > 0:
+				while queue[0].quote_id not in self.quotes:
+					queue.popleft()
+				break
+			del self.lob[price]
+			cleared += 1
+		if cleared > 0:
+			if self.book_type == 'Bid':
+				del price_index[depth - cleared:]
+				del self.lob_anon[depth - cleared:]
+			else:
+				del price_index[:cleared]
+				del self.lob_anon[:cleared]
+		self.update_best()
+		if fills:
+			self.version += 1
+			if self.best_price is not None:
+				self.lob_anon[-1 if self.book_type == 'Bid' else 0][1] = self.lob[self.best_price][0]
+		return fills
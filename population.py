@@ -0,0 +1,310 @@
+import sys
+import json
+import numpy as np
+from market_maker import MarketMaker
+from liquidity_consumer import LiquidityConsumer
+from momentum_trader import MomentumTrader
+from mean_reversion_trader import MeanReversionTrader
+from noise_trader import NoiseTrader
+from random_stream import RandomStream
+
+# agent types of a population config, in the order they act in a period
+AGENT_CLASSES = {
+	"market_maker": MarketMaker,
+	"liquidity_consumer": LiquidityConsumer,
+	"momentum_trader": MomentumTrader,
+	"mean_reversion_trader": MeanReversionTrader,
+	"noise_trader": NoiseTrader}
+
+# one trader of each type, the market of the original model
+DEFAULT_CONFIG = {agent_type: {"count": 1} for agent_type in AGENT_CLASSES}
+
+
+def load_config(file_name):
+	"""
+	Read a population config, a JSON object of agent type -> {"count": n, "params": {attribute: value}}.
+	A value is the same for every member, or a list with one value per member,
+	or {"uniform": [low, high]} or {"choice": [values]} to draw one per member.
+	Agent types left out of the config are not in the market.
+	"""
+	with open(file_name) as config_file:
+		return json.load(config_file)
+
+
+def member_values(key, value, count, generator):
+	"""
+	:return: list of the values of a parameter for count members, see load_config
+	"""
+	if isinstance(value, list):
+		if len(value) != count:
+			sys.exit("[Error] {} has {} values for {} members".format(key, len(value), count))
+		return value
+	if isinstance(value, dict):
+		if "uniform" in value:
+			low, high = value["uniform"]
+			return generator.uniform(low, high, count).tolist()
+		if "choice" in value:
+			choices = value["choice"]
+			return [choices[index] for index in generator.integers(len(choices), size=count)]
+		sys.exit("[Error] bad value of {}".format(key))
+	return [value] * count
+
+
+def create_agents(config=None, params=None, seed=None):
+	"""
+	Create the agents of a market. A type with one member is a single trader with its usual id,
+	more members get ids like "noise trader 12"; noise and momentum traders with more than
+	one member are vectorized populations.
+	:param config: population config, see load_config; DEFAULT_CONFIG if None
+	:param params: dict of "agent_type.attribute" -> value, overriding the params of the config
+	:param seed: seed of the day, each agent type gets its own random streams spawned from it
+	:return: dict of agent id -> trader or population, in the order they act in a period
+	"""
+	if config is None:
+		config = DEFAULT_CONFIG
+	type_params = {agent_type: dict(config[agent_type].get("params", {})) for agent_type in config}
+	for key, value in (params or {}).items():
+		agent_type, _, attribute = key.partition(".")
+		if agent_type not in type_params:
+			sys.exit("[Error] unknown parameter {}".format(key))
+		if config[agent_type].get("count", 1) < 1:
+			sys.exit("[Error] parameter {} has no agents to set, the count of {} is 0".format(key, agent_type))
+		type_params[agent_type][attribute] = value
+
+	agents = dict()
+	unknown = [agent_type for agent_type in config if agent_type not in AGENT_CLASSES]
+	if unknown:
+		sys.exit("[Error] unknown agent types {}".format(unknown))
+	agent_types = [agent_type for agent_type in AGENT_CLASSES if agent_type in config]
+	seeds = np.random.SeedSequence(seed).spawn(len(agent_types))
+	for agent_type, type_seed in zip(agent_types, seeds):
+		agent_class = AGENT_CLASSES[agent_type]
+		count = config[agent_type].get("count", 1)
+		if count < 1:
+			continue
+		generator = np.random.default_rng(type_seed.spawn(1)[0])
+		values = dict()
+		for attribute, value in type_params[agent_type].items():
+			values[attribute] = member_values(agent_type + "." + attribute, value, count, generator)
+		if count == 1:
+			members = [agent_class(type_seed)]
+		else:
+			members = [agent_class(member_seed) for member_seed in type_seed.spawn(count)]
+			for number, member in enumerate(members):
+				member.trader_id = "{} {}".format(member.trader_id, number)
+		for attribute, member_value in values.items():
+			if not hasattr(members[0], attribute):
+				sys.exit("[Error] unknown parameter {}.{}".format(agent_type, attribute))
+			for member, value in zip(members, member_value):
+				setattr(member, attribute, value)
+		if count > 1 and agent_type in POPULATION_CLASSES:
+			population = POPULATION_CLASSES[agent_type](members, type_seed)
+			agents[population.trader_id] = population
+		else:
+			for member in members:
+				agents[member.trader_id] = member
+	return agents
+
+
+class Population:
+	"""
+	A group of traders of one type which is scheduled as one agent.
+	Each member has a clock, the next period it acts in, drawn as a geometric gap from its
+	activation probability; the population acts in the earliest of these periods.
+	The decisions of the members acting in a period are drawn as NumPy arrays over
+	their parameters, and only the resulting orders are built.
+	The members stay Trader objects, for the trade bookkeeping and their order ids on the book.
+	"""
+
+	def __init__(self, trader_id, members, seed=None, activation_attribute=None):
+		"""
+		:param trader_id: id of the population, like "noise traders"
+		:param members: list of the traders, with their parameters set
+		:param seed: seed of the random stream of the population
+		:param activation_attribute: name of the members' activation probability, like delta_nt
+		"""
+		self.trader_id = trader_id
+		self.members = members
+		self.stream = RandomStream(seed)
+		self.generator = self.stream.generator
+		self.delta = self.parameter(activation_attribute)
+		# next period of each member, inf for members which never act
+		self.clock = np.full(len(members), np.inf)
+
+	def parameter(self, attribute, dtype=np.float64):
+		"""
+		:return: numpy array of an attribute over the members
+		"""
+		return np.array([getattr(member, attribute) for member in self.members], dtype=dtype)
+
+	def gaps(self, delta):
+		"""
+		:return: geometric gaps to the next activations of members, inf where delta <= 0
+		"""
+		acting = delta > 0
+		gaps = np.full(len(delta), np.inf)
+		gaps[acting] = self.generator.geometric(np.minimum(delta[acting], 1.0))
+		return gaps
+
+	def earliest(self):
+		activation = self.clock.min()
+		if activation == np.inf:
+			return None
+		return int(activation)
+
+	def first_activation(self, start_time):
+		self.clock = start_time - 1 + self.gaps(self.delta)
+		return self.earliest()
+
+	def next_activation(self, cur_time):
+		return self.earliest()
+
+	def open_session(self, session, start_time):
+		for member in self.members:
+			member.open_session(session, start_time)
+
+	def close_session(self, session, end_time):
+		for member in self.members:
+			member.close_session(session, end_time)
+
+	def draw_active(self, cur_time):
+		"""
+		:return: indices of the members acting in cur_time, whose clocks move on to their next periods
+		"""
+		active = np.flatnonzero(self.clock == cur_time)
+		self.clock[active] = cur_time + self.gaps(self.delta[active])
+		return active
+
+	def __str__(self):
+		return "{} ({} members)".format(self.trader_id, len(self.members))
+
+
+class NoiseTraderPopulation(Population):
+	"""
+	Noise traders with heterogeneous parameters, with the decisions of NoiseTrader.act drawn for all acting members at once.
+	"""
+
+	def __init__(self, members, seed=None):
+		super(NoiseTraderPopulation, self).__init__("noise traders", members, seed, "delta_nt")
+		self.buy_or_sell_prob = self.parameter("buy_or_sell_prob")
+		self.alpha_m = self.parameter("alpha_m")
+		self.alpha_l = self.parameter("alpha_l")
+		self.mu_mo = self.parameter("mu_mo")
+		self.sigma_mo = self.parameter("sigma_mo")
+		self.mu_lo = self.parameter("mu_lo")
+		self.sigma_lo = self.parameter("sigma_lo")
+		self.x_min_off_spr = self.parameter("x_min_off_spr")
+		self.beta_off_spr = self.parameter("beta_off_spr")
+		self.alpha_crs = self.parameter("alpha_crs")
+		self.alpha_in_spr = self.parameter("alpha_in_spr")
+		self.alpha_spr = self.parameter("alpha_spr")
+		policies = [member.cancel_policy for member in members]
+		if any(policy not in ("all", "oldest") for policy in policies):
+			sys.exit("[Error] bad cancel_policy value")
+		self.cancel_oldest = np.array([policy == "oldest" for policy in policies])
+
+	def act(self, exchange, cur_time):
+		"""
+		:param exchange: the instance of Exchange Class
+		:param cur_time: current time
+		:return: tuple of the orders of the acting members, cancels are done on the exchange directly
+		"""
+		active = self.draw_active(cur_time)
+		count = len(active)
+		uniforms = self.generator.random((5, count))
+		buy = uniforms[0] <= self.buy_or_sell_prob[active]
+		action = uniforms[1]
+		market = action < self.alpha_m[active]
+		limit = ~market & (action < self.alpha_m[active] + self.alpha_l[active])
+		cancel = ~market & ~limit
+
+		# order sizes, market and limit orders have their own log-size parameters
+		mu = np.where(market, self.mu_mo[active], self.mu_lo[active])
+		sigma = np.where(market, self.sigma_mo[active], self.sigma_lo[active])
+		quantities = (np.exp(mu + sigma * uniforms[2]) + 0.5).astype(np.int64)
+
+		best_bid_price = exchange.market_data.best_bid
+		best_ask_price = exchange.market_data.best_ask
+		if best_bid_price is None:
+			best_bid_price = exchange.price
+		if best_ask_price is None:
+			best_ask_price = exchange.price
+		# kind of limit order, by the cumulative probabilities of NoiseTrader.act
+		kind = uniforms[3]
+		crs = kind < self.alpha_crs[active]
+		in_spr = ~crs & (kind < self.alpha_crs[active] + self.alpha_in_spr[active])
+		spr = ~crs & ~in_spr & (kind < self.alpha_crs[active] + self.alpha_in_spr[active] + self.alpha_spr[active])
+		# market and crossing orders take the opposite best price, spread orders join their own side
+		cross = market | (limit & crs)
+		join = limit & spr
+		off_spr = limit & ~crs & ~in_spr & ~spr
+		price_in_spr = best_bid_price + (best_ask_price - best_bid_price) * uniforms[4]
+		beta = self.beta_off_spr[active]
+		price_off_spr = np.minimum(self.x_min_off_spr[active] * (1 - uniforms[4]) ** (-1 / (beta - 1)), 0.2)
+		bid_prices = np.where(cross, best_ask_price, np.where(
+			join, best_bid_price, np.where(off_spr, best_bid_price - price_off_spr, price_in_spr)))
+		ask_prices = np.where(cross, best_bid_price, np.where(
+			join, best_ask_price, np.where(off_spr, best_ask_price + price_off_spr, price_in_spr)))
+
+		orders = []
+		members = self.members
+		for index, member_index in enumerate(active.tolist()):
+			member = members[member_index]
+			if cancel[index]:
+				order_type = "Bid" if buy[index] else "Ask"
+				if self.cancel_oldest[member_index]:
+					exchange.del_oldest_order(member.trader_id, order_type, cur_time)
+				else:
+					exchange.del_trader_all_orders(member.trader_id, [order_type], cur_time)
+			elif buy[index]:
+				orders.append(member.buy(float(bid_prices[index]), int(quantities[index]), cur_time))
+			else:
+				orders.append(member.sell(float(ask_prices[index]), int(quantities[index]), cur_time))
+		return tuple(orders)
+
+
+class MomentumTraderPopulation(Population):
+	"""
+	Momentum traders with heterogeneous parameters, with the rates of change of MomentumTrader.act
+	computed for all acting members at once.
+	"""
+
+	def __init__(self, members, seed=None):
+		super(MomentumTraderPopulation, self).__init__("momentum traders", members, seed, "delta_mt")
+		self.n_r = self.parameter("n_r", np.int64)
+		self.k = self.parameter("k")
+
+	def act(self, exchange, cur_time):
+		"""
+		:param exchange: the instance of Exchange Class
+		:param cur_time: current time
+		:return: tuple of the orders of the acting members
+		"""
+		active = self.draw_active(cur_time)
+		n_r = self.n_r[active]
+		ready = n_r <= len(exchange.prices)
+		active = active[ready]
+		n_r = n_r[ready]
+		if len(active) == 0:
+			return ()
+		tail = np.asarray(exchange.prices[-int(n_r.max()):], dtype=np.float64)
+		past_prices = tail[len(tail) - n_r]
+		roc_t = (tail[-1] - past_prices) / past_prices
+		members = self.members
+		# wealth changes with the members' trades, so it is read when they act
+		wealth = np.array([members[member_index].wealth for member_index in active.tolist()], dtype=np.float64)
+		volumes = (np.abs(roc_t) * wealth + 0.5).astype(np.int64)
+		k = self.k[active]
+		orders = []
+		for index, member_index in enumerate(active.tolist()):
+			if roc_t[index] >= k[index]:
+				orders.append(members[member_index].buy(exchange.market_data.best_ask, int(volumes[index]), cur_time))
+			elif roc_t[index] <= -k[index]:
+				orders.append(members[member_index].sell(exchange.market_data.best_bid, int(volumes[index]), cur_time))
+		return tuple(orders)
+
+
+# agent types with a vectorized population class
+POPULATION_CLASSES = {
+	"noise_trader": NoiseTraderPopulation,
+	"momentum_trader": MomentumTraderPopulation}
@@ -0,0 +1,48 @@
+import math
+import itertools
+import numpy as np
+
+
+class RandomStream:
+	"""
+	A seeded stream of uniform random numbers for one agent, drawn from a NumPy Generator
+	in blocks, so that runs are reproducible and agents do not share the global random module.
+	random() is the __next__ of an iterator over the blocks, which costs about as much as
+	random.random(); a new block is drawn when the last one is used up.
+	"""
+
+	def __init__(self, seed=None, block_size=4096):
+		"""
+		:param seed: seed of the Generator, an int or a numpy SeedSequence, fresh entropy if None
+		:param block_size: number of uniforms drawn at a time
+		"""
+		self.generator = np.random.default_rng(seed)
+		self.block_size = block_size
+		# iter(callable, sentinel) never ends, draw_block does not return None
+		self.random = itertools.chain.from_iterable(iter(self.draw_block, None)).__next__
+
+	def draw_block(self):
+		return self.generator.random(self.block_size).tolist()
+
+	def uniform(self, a, b):
+		"""
+		:return: a uniform float in [a, b)
+		"""
+		return a + (b - a) * self.random()
+
+	def randint(self, a, b):
+		"""
+		:return: a uniform int in [a, b], both ends included like random.randint
+		"""
+		return a + int(self.random() * (b - a + 1))
+
+	def geometric(self, p):
+		"""
+		number of Bernoulli(p) trials up to and including the first success, by inversion of one uniform
+		:return: an int >= 1, or None if p <= 0 and there is never a success
+		"""
+		if p >= 1:
+			return 1
+		if p <= 0:
+			return None
+		return 1 + int(math.log(1.0 - self.random()) / math.log(1.0 - p))
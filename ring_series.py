@@ -0,0 +1,135 @@
+import numpy as np
+
+
+class RingSeries:
+	"""
+	A per-period series which keeps only its latest capacity values, in a typed NumPy ring buffer.
+	len() counts every value appended, and indexing works like on the list it replaces
+	(series[-1], series[-n], series[-n:], or absolute indices) as long as the values asked for
+	are still held; older values raise an IndexError.
+	Iterating or converting the whole series with np.asarray also raises an IndexError once values
+	have been dropped, rather than silently covering fewer than len() values; tail() and
+	held_values give the values still held.
+	With an EventSpiller attached, every value is written to disk before it is overwritten,
+	in chunks of capacity values, and event_io.load_spilled_event_log reads the full series back
+	as the column "value".
+	"""
+
+	def __init__(self, capacity, dtype=np.float64):
+		"""
+		:param capacity: number of latest values held in memory
+		:param dtype: NumPy type of the values
+		"""
+		self.capacity = capacity
+		self.buffer = np.zeros(capacity, dtype=dtype)
+		# number of values appended so far, and the part of them written to disk
+		self.count = 0
+		self.spilled = 0
+		self.position = 0
+		self.spiller = None
+		self.name = None
+
+	def attach_spiller(self, spiller, name):
+		"""
+		:param spiller: the instance of event_io.EventSpiller
+		:param name: name of this series in the spill directory
+		"""
+		self.spiller = spiller
+		self.name = name
+		self.spilled = self.count
+
+	def detach_spiller(self):
+		self.spiller = None
+
+	def spill(self):
+		"""
+		hand the values not yet written to the spiller
+		"""
+		if self.spiller is None or self.spilled == self.count:
+			return
+		chunk = self[self.spilled:self.count]
+		kind = "float" if self.buffer.dtype.kind == "f" else "int"
+		self.spiller.write(self.name, {"value": chunk}, ["value:" + kind], [])
+		self.spilled = self.count
+
+	def append(self, value):
+		if self.spiller is not None and self.count - self.spilled == self.capacity:
+			self.spill()
+		self.buffer[self.position] = value
+		self.count += 1
+		self.position += 1
+		if self.position == self.capacity:
+			self.position = 0
+
+	def extend(self, values):
+		values = np.asarray(values, dtype=self.buffer.dtype)
+		start = 0
+		while start < len(values):
+			if self.spiller is not None:
+				if self.count - self.spilled == self.capacity:
+					self.spill()
+				room = self.capacity - (self.count - self.spilled)
+			else:
+				room = self.capacity
+			piece = values[start:start + room]
+			length = len(piece)
+			first = min(length, self.capacity - self.position)
+			self.buffer[self.position:self.position + first] = piece[:first]
+			self.buffer[:length - first] = piece[first:]
+			self.count += length
+			self.position = (self.position + length) % self.capacity
+			start += length
+
+	def held(self):
+		"""
+		:return: the index of the oldest value still in memory
+		"""
+		return max(self.count - self.capacity, 0)
+
+	def __len__(self):
+		return self.count
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			indices = np.arange(*index.indices(self.count))
+			if len(indices) > 0 and indices.min() < self.held():
+				raise IndexError("values have been dropped from the ring buffer")
+			return self.buffer[indices % self.capacity]
+		if index < 0:
+			index += self.count
+		if index < self.held() or index >= self.count:
+			raise IndexError("series index out of range or dropped from the ring buffer")
+		return self.buffer[index % self.capacity].item()
+
+	def tail(self):
+		"""
+		:return: NumPy array of the values still held, oldest first, from index held()
+		"""
+		return self[self.held():self.count]
+
+	def whole(self):
+		if self.held() > 0:
+			raise IndexError("the series has dropped its oldest values, use tail() or held_values")
+		return self.tail()
+
+	def __iter__(self):
+		return iter(self.whole().tolist())
+
+	def __array__(self, dtype=None, copy=None):
+		values = self.whole()
+		if dtype is not None:
+			values = values.astype(dtype)
+		return values
+
+
+def held_values(series, dtype=np.float64):
+	"""
+	The values of a per-period series which are in memory: all of a list or array,
+	the tail of a RingSeries.
+	:param series: list, NumPy array or RingSeries
+	:param dtype: NumPy type of the returned values
+	:return: index of the first value returned, NumPy array of the values
+	"""
+	if isinstance(series, RingSeries):
+		return series.held(), series.tail().astype(dtype)
+	return 0, np.asarray(series, dtype=dtype)
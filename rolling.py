@@ -0,0 +1,127 @@
+import math
+
+
+class RollingMean:
+	"""
+	Mean of the last window values of a series, kept in a ring buffer with a running sum,
+	so appending a value and reading the mean are constant time.
+	The running sum is recomputed from the buffer each time it wraps around,
+	which keeps its rounding error from growing over a long series.
+	"""
+
+	def __init__(self, window):
+		"""
+		:param window: number of latest values in the mean
+		"""
+		self.window = window
+		self.values = [0.0] * window
+		self.position = 0
+		# number of values appended so far, including the ones out of the window
+		self.count = 0
+		self.total = 0.0
+		self.newest = None
+		# value which left the window on the latest append, None while the window is filling
+		self.dropped = None
+
+	def append(self, value):
+		if self.count >= self.window:
+			self.dropped = self.values[self.position]
+			self.total += value - self.dropped
+		else:
+			self.dropped = None
+			self.total += value
+		self.values[self.position] = value
+		self.newest = value
+		self.count += 1
+		self.position += 1
+		if self.position == self.window:
+			self.position = 0
+			self.total = sum(self.values)
+
+	def extend(self, value, repeat):
+		"""
+		append the same value repeat times, in at most window + 1 steps
+		"""
+		steps = min(repeat, self.window + 1)
+		for _ in range(steps):
+			self.append(value)
+		# once the buffer only holds value, more appends leave it as it is
+		self.count += repeat - steps
+
+	def fill(self, series):
+		"""
+		start from an existing series, as if each of its values had been appended
+		"""
+		for value in series[-(self.window + 1):]:
+			self.append(value)
+		self.count = len(series)
+
+	def size(self):
+		return min(self.count, self.window)
+
+	def mean(self):
+		"""
+		:return: mean of the last window values, or of all values while fewer have been appended
+		"""
+		return self.total / self.size()
+
+	def trend(self):
+		"""
+		Direction of the mean over the latest append, computed exactly from the values that changed:
+		with a full window it moves with the newest value against the dropped one,
+		while filling it moves with the newest value against the mean before it.
+		:return: 1 if the mean rose, -1 if it fell, 0 if it did not change or fewer than two values were appended
+		"""
+		if self.count < 2:
+			return 0
+		if self.dropped is not None:
+			previous = self.dropped
+		else:
+			previous = (self.total - self.newest) / (self.count - 1)
+		if self.newest > previous:
+			return 1
+		if self.newest < previous:
+			return -1
+		return 0
+
+
+class RollingVariance(RollingMean):
+	"""
+	Mean and sample variance of the last window values, updated in constant time with Welford's method:
+	a new value is added, and once the window is full the dropped value is removed in the same step.
+	Like the running sum, the mean and the sum of squared deviations are recomputed
+	from the buffer each time it wraps around.
+	"""
+
+	def __init__(self, window):
+		super(RollingVariance, self).__init__(window)
+		self.average = 0.0
+		# sum of squared deviations from the average
+		self.m2 = 0.0
+
+	def append(self, value):
+		super(RollingVariance, self).append(value)
+		size = self.size()
+		if self.position == 0:
+			self.average = self.total / size
+			self.m2 = sum((item - self.average) ** 2 for item in self.values)
+		elif self.dropped is None:
+			delta = value - self.average
+			self.average += delta / size
+			self.m2 += delta * (value - self.average)
+		else:
+			previous = self.average
+			self.average += (value - self.dropped) / size
+			self.m2 += (value - self.dropped) * (value - self.average + self.dropped - previous)
+
+	def variance(self):
+		"""
+		:return: sample variance (ddof=1) of the last window values, nan with fewer than two values
+		"""
+		size = self.size()
+		if size < 2:
+			return float("nan")
+		return max(self.m2, 0.0) / (size - 1)
+
+	def std(self):
+		return math.sqrt(self.variance())
@@ -0,0 +1,81 @@
+import heapq
+import util
+
+
+class Scheduler:
+	"""
+	Event-driven main loop of a trading day.
+	Each trader acts in a period with probability activation_prob, so the gap to its next
+	activation is geometric; the agents draw these gaps from their own random streams
+	(first_activation and next_activation) and the scheduler keeps the next activations in a heap,
+	so only the periods in which some agent acts are processed.
+	The per-period series of the exchange are filled in for the skipped periods.
+	Agents activated in the same period act in the order of the agents dict.
+	"""
+
+	def __init__(self, exchange, agents, record_orders=None):
+		"""
+		:param exchange: the instance of Exchange Class
+		:param agents: dict of agent id -> trader or population.Population
+		:param record_orders: trader ids whose submitted orders are kept in self.orders
+		"""
+		self.exchange = exchange
+		self.agents = agents
+		# every trading member, by the trader ids on the book, for the trade bookkeeping
+		self.traders = dict()
+		for agent in agents.values():
+			for member in agent.members:
+				self.traders[member.trader_id] = member
+		self.orders = dict()
+		for trader_id in record_orders or []:
+			self.orders[trader_id] = {"bids": [], "asks": []}
+
+	def submit(self, order, cur_time):
+		if order is None:
+			return
+		if order.trader_id in self.orders:
+			if order.order_type == "Bid":
+				self.orders[order.trader_id]["bids"].append(order)
+			else:
+				self.orders[order.trader_id]["asks"].append(order)
+		trades = self.exchange.process_order(cur_time, order)
+		util.process_trades(trades, self.traders, order, cur_time)
+
+	def run(self, start_time, end_time, verbose=True):
+		"""
+		Simulate the periods from start_time to end_time.
+		:param verbose: print the progress every 1000 periods
+		"""
+		exchange = self.exchange
+		ranked = list(self.agents.values())
+		activations = []
+		for rank, agent in enumerate(ranked):
+			activation = agent.first_activation(start_time)
+			if activation is not None:
+				activations.append((activation, rank))
+		heapq.heapify(activations)
+
+		reported = -1
+		while activations and activations[0][0] < end_time:
+			cur_time = activations[0][0]
+			if verbose and cur_time // 1000 != reported:
+				reported = cur_time // 1000
+				print("\ntime: {}".format(reported * 1000))
+			exchange.fill_periods(cur_time)
+			while activations and activations[0][0] == cur_time:
+				rank = activations[0][1]
+				agent = ranked[rank]
+				orders = agent.act(exchange, cur_time)
+				# the market maker quotes both sides, ask first, and populations return the orders of their members
+				if isinstance(orders, tuple):
+					for order in orders:
+						self.submit(order, cur_time)
+				else:
+					self.submit(orders, cur_time)
+				activation = agent.next_activation(cur_time)
+				if activation is None:
+					heapq.heappop(activations)
+				else:
+					heapq.heapreplace(activations, (activation, rank))
+			exchange.end_period()
+		exchange.fill_periods(end_time)
@@ -0,0 +1,106 @@
+import argparse
+import logging
+from exchange import Exchange
+from market_maker import MarketMaker
+from mean_reversion_trader import MeanReversionTrader
+from scheduler import Scheduler
+import population
+
+
+def run_sessions(
+		sessions, session_length=306000, seed=None, logger=None, verbose=True, params=None, config=None,
+		carry_over=False, retention=None, history_dir=None, on_close=None, record_orders=False):
+	"""
+	Simulate consecutive sessions, trading days, with the same agents and exchange.
+	Time runs on across the sessions, session k covering the session_length periods from
+	k * session_length, so the per-period series of the exchange are continuous.
+	Each session is opened and closed by hooks: the exchange resets its session records and rotates
+	its event logs, into the files of the new session when spilling or by dropping the earlier
+	records (Exchange.open_session), and at the close clears the book unless carry_over
+	(Exchange.close_session); the agents reset their daily state in Trader.open_session,
+	like the liquidity consumer taking a new large order.
+	With several sessions the per-period series keep one session of values by default,
+	so memory stays flat however many sessions are run, see Exchange.retain.
+	:param sessions: number of sessions
+	:param session_length: number of periods of a session
+	:param seed: seed of the random streams of the traders, see main.run_simulation
+	:param logger: the instance of Logger, for debugging code
+	:param verbose: print the progress every 1000 periods
+	:param params: dict of "agent_type.attribute" overrides of the traders
+	:param config: population config, see population.load_config; one trader of each type if None
+	:param carry_over: keep the resting orders from one session to the next
+	:param retention: number of latest values of the exchange's series kept in memory; if None,
+		session_length with several sessions or a history_dir, and all values otherwise
+	:param history_dir: directory the full history is streamed into, a subdirectory per session;
+		the caller finishes it with exchange.stop_spill()
+	:param on_close: function(session, exchange, agents) called after each session, for daily statistics
+	:param record_orders: keep the orders submitted by the market makers, they grow with the run
+	:return: the instance of Exchange after the last session, dict of agents, and the orders of the market makers
+	"""
+	if logger is None:
+		logger = logging.getLogger(__name__)
+	exchange = Exchange()
+	if retention is None and (sessions > 1 or history_dir is not None):
+		retention = session_length
+	if retention is not None:
+		exchange.retain(retention, history_dir)
+	agents = population.create_agents(config, params, seed)
+	market_makers = []
+	for agent in agents.values():
+		if isinstance(agent, MeanReversionTrader):
+			agent.logger = logger
+		elif isinstance(agent, MarketMaker):
+			market_makers.append(agent.trader_id)
+	scheduler = Scheduler(exchange, agents, record_orders=market_makers if record_orders else None)
+	for session in range(sessions):
+		start_time = session * session_length
+		end_time = start_time + session_length
+		exchange.open_session(session)
+		for agent in agents.values():
+			agent.open_session(session, start_time)
+		if verbose and sessions > 1:
+			print("\nsession: {}".format(session))
+		scheduler.run(start_time, end_time, verbose)
+		for agent in agents.values():
+			agent.close_session(session, end_time)
+		exchange.close_session(end_time - 1, carry_over)
+		if on_close is not None:
+			on_close(session, exchange, agents)
+	mm_order = {"bids": [], "asks": []}
+	for trader_id in scheduler.orders:
+		mm_order["bids"].extend(scheduler.orders[trader_id]["bids"])
+		mm_order["asks"].extend(scheduler.orders[trader_id]["asks"])
+	return exchange, agents, mm_order
+
+
+def main_sessions():
+	parser = argparse.ArgumentParser(description="Simulate consecutive trading days in one process")
+	parser.add_argument("--sessions", type=int, default=5)
+	parser.add_argument("--session-length", type=int, default=306000)
+	parser.add_argument("--seed", type=int, default=None)
+	parser.add_argument("--config", default=None, help="population config, see population.load_config")
+	parser.add_argument("--carry-over", action="store_true", help="keep the book from one day to the next")
+	parser.add_argument(
+		"--retention", type=int, default=None,
+		help="keep only this many latest values in memory, one session of values by default")
+	parser.add_argument("--history-dir", default=None, help="stream the full history into this directory")
+	args = parser.parse_args()
+	config = population.load_config(args.config) if args.config else None
+
+	# trades of the earlier sessions, to count the trades of each
+	counted = [0]
+
+	def report(session, exchange, agents):
+		trades = len(exchange.all_deal_prices)
+		print("session {}: close {:.2f}, {} trades".format(session, exchange.price, trades - counted[0]))
+		counted[0] = trades
+
+	exchange, agents, mm_order = run_sessions(
+		args.sessions, args.session_length, args.seed, verbose=False, config=config, carry_over=args.carry_over,
+		retention=args.retention, history_dir=args.history_dir, on_close=report)
+	if exchange.spiller is not None:
+		exchange.stop_spill()
+
+
+if __name__ == "__main__":
+	main_sessions()
@@ -5,66 +5,134 @@ import matplotlib.pyplot as plt
 from scipy.stats import kurtosis
 import random
 import uuid
+import multi_scale
+from ring_series import held_values
 
 
-def auto_correlation(x, lags):
+def auto_correlation(x, lags, absolute=True):
 	"""
 	Calculate the auto correlation coefficient within lags order, return lags values, and
 	calculate the sequence mean and standard deviation respectively.
+	Lag k is the correlation of x[k:] and x[:n - k], each with its own mean and standard deviation;
+	all lags come from one FFT of x, plus cumulative sums for the means and deviations.
 	:param x: time series
 	:param lags: logs
-	:return: auto correction coefficient
+	:param absolute: return the absolute value of each coefficient, otherwise keep its sign
+	:return: auto correction coefficient, numpy array of lags 1..lags
 	"""
+	# shifting x does not change the coefficients but keeps the sums below well conditioned
+	x = np.asarray(x, dtype=np.float64)
+	x = x - x.mean()
 	n = len(x)
-	x = np.array(x)
-	result = []
-	for i in range(1, lags + 1):
-		y = abs(np.correlate(x[i:] - x[i:].mean(), x[:n - i] - x[:n - i].mean())[0])
-		d = (x[i:].std() * x[:n - i].std() * (n - i))
-		result.append(y / d)
+	lag = np.arange(1, min(lags, n - 1) + 1)
+	# cross[k] = sum of x[t + k] * x[t], from the FFT unless a few dot products are cheaper
+	size = 2 ** int(np.ceil(np.log2(2 * n)))
+	if len(lag) <= np.log2(size):
+		cross = np.array([np.dot(x[k:], x[:n - k]) for k in lag])
+	else:
+		spectrum = np.fft.rfft(x, size)
+		cross = np.fft.irfft(spectrum * np.conj(spectrum), size)[lag]
+	cum_sum = np.concatenate(([0.0], np.cumsum(x)))
+	cum_square = np.concatenate(([0.0], np.cumsum(x * x)))
+	m = n - lag
+	head_sum = cum_sum[m]
+	tail_sum = cum_sum[n] - cum_sum[lag]
+	head_square = cum_square[m] - head_sum * head_sum / m
+	tail_square = (cum_square[n] - cum_square[lag]) - tail_sum * tail_sum / m
+	with np.errstate(divide="ignore", invalid="ignore"):
+		result = (cross - head_sum * tail_sum / m) / np.sqrt(head_square * tail_square)
+	if absolute:
+		result = np.abs(result)
 	return result
 
 
-def hurst(data):
+def hurst(data, scales=None, levels=6, min_size=8):
 	"""
-	Compute the hurst exponent of input data.
-	:param data: time series
-	:return: the value of hurst exponent
+	Compute the hurst exponent of input data with rescaled range (R/S) analysis.
+	For each segment size the series is reshaped into a (segments, size) array,
+	so every segment of a size is handled in one vectorized step.
+	:param data: time series of increments, like order signs
+	:param scales: segment sizes; by default the series is split into 1, 2, 4, ... 2 ** (levels - 1) parts
+	:param levels: number of dyadic splits used when scales is None
+	:param min_size: smallest segment size used
+	:return: the value of hurst exponent, nan if fewer than two segment sizes are usable
 	"""
-	n = 6
-	data = pd.Series(data).pct_change()[1:]
-	ars = list()
-	lag = list()
-	for i in range(n):
-		m = 2 ** i
-		size = np.size(data) // m
-		lag.append(size)
-		panel = {}
-		for j in range(m):
-			panel[str(j)] = data[j * size:(j + 1) * size].values
-
-		panel = pd.DataFrame(panel)
-		mean = panel.mean()
-		deviation = (panel - mean).cumsum()
-		maxi = deviation.max()
-		mini = deviation.min()
-		sigma = panel.std()
-		rs = maxi - mini
-		rs = rs / sigma
-		ars.append(rs.mean())
-
-	lag = np.log10(lag)
+	data = np.asarray(data, dtype=np.float64)
+	n = len(data)
+	if scales is None:
+		scales = [n // 2 ** i for i in range(levels)]
+	sizes = []
+	ars = []
+	for size in scales:
+		if size < min_size or size > n:
+			continue
+		count = n // size
+		panel = data[:count * size].reshape(count, size)
+		deviation = np.cumsum(panel - panel.mean(axis=1, keepdims=True), axis=1)
+		rs = deviation.max(axis=1) - deviation.min(axis=1)
+		sigma = panel.std(axis=1, ddof=1)
+		# constant segments have no defined rescaled range
+		valid = sigma > 0
+		if valid.any():
+			sizes.append(size)
+			ars.append(np.mean(rs[valid] / sigma[valid]))
+	if len(sizes) < 2:
+		return np.nan
+
+	lag = np.log10(sizes)
 	ars = np.log10(ars)
 	hurst_exponent = np.polyfit(lag, ars, 1)
 	result = hurst_exponent[0]
 	return result
 
 
+def detrended_fluctuation(data, scales=None, order=1, min_size=16):
+	"""
+	Compute the scaling exponent of input data with detrended fluctuation analysis (DFA).
+	The integrated series is reshaped into segments of each size, a polynomial trend is fitted
+	to all segments of a size at once, and the exponent is the slope of log F(size) against log size.
+	For long memory increments it estimates the hurst exponent.
+	:param data: time series of increments, like order signs
+	:param scales: segment sizes; by default 20 log-spaced sizes from min_size to len(data) // 4
+	:param order: order of the polynomial trend removed from each segment
+	:param min_size: smallest segment size used
+	:return: the DFA exponent, nan if fewer than two segment sizes are usable
+	"""
+	data = np.asarray(data, dtype=np.float64)
+	if len(data) == 0:
+		return np.nan
+	profile = np.cumsum(data - data.mean())
+	n = len(profile)
+	if scales is None:
+		scales = np.unique(np.logspace(np.log10(min_size), np.log10(max(n // 4, min_size)), 20).astype(int))
+	sizes = []
+	fluctuations = []
+	for size in scales:
+		if size < max(min_size, order + 2) or size > n:
+			continue
+		count = n // size
+		segments = profile[:count * size].reshape(count, size).T
+		# least squares trends of all segments, by projecting onto an orthonormal polynomial basis
+		basis = np.linalg.qr(np.vander(np.linspace(-1, 1, size), order + 1))[0]
+		trend = basis @ (basis.T @ segments)
+		fluctuation = np.sqrt(np.mean((segments - trend) ** 2))
+		if fluctuation > 0:
+			sizes.append(size)
+			fluctuations.append(fluctuation)
+	if len(sizes) < 2:
+		return np.nan
+	return np.polyfit(np.log10(sizes), np.log10(fluctuations), 1)[0]
+
+
 def long_memory_in_order_flow(exchange):
-	ac = auto_correlation(exchange.orders_signs, 1)
-	h = hurst(exchange.orders_signs)
+	start, orders_signs = held_values(exchange.orders_signs)
+	ac = auto_correlation(orders_signs, 1)
+	h = hurst(orders_signs)
+	alpha = detrended_fluctuation(orders_signs)
 	print("Auto-correlation: {}".format(ac))
 	print("Hurst: {}".format(h))
+	print("DFA: {}".format(alpha))
+	return {"auto_correlation": float(ac[0]), "hurst": float(h), "dfa": float(alpha)}
 
 
 def price_spike_example():
@@ -84,120 +152,192 @@ def price_spike_example():
 	plt.show()
 
 
+def price_runs(prices, init_price, rate=0.00001):
+	"""
+	Split a price series into runs of consecutive up, down or flat moves.
+	A move is up if the price rises by at least init_price * rate, down if it falls by more than that.
+	:param prices: price series
+	:param init_price: price before the first one of the series
+	:param rate: minimum relative move
+	:return: run starts, run ends (exclusive), run directions (1, -1 or 0) in move indices,
+	and the price path with init_price in front
+	"""
+	path = np.concatenate(([init_price], np.asarray(prices, dtype=np.float64)))
+	diff = np.diff(path)
+	threshold = init_price * rate
+	up = diff >= threshold
+	moves = np.zeros(len(diff), dtype=np.int8)
+	moves[up] = 1
+	moves[~up & (-diff > threshold)] = -1
+	change = np.flatnonzero(moves[1:] != moves[:-1]) + 1
+	starts = np.concatenate(([0], change))
+	ends = np.concatenate((change, [len(moves)]))
+	if len(moves) == 0:
+		starts = ends = np.zeros(0, dtype=np.int64)
+	return starts, ends, moves[starts], path
+
+
+def price_spikes(runs, up_or_down_times=5):
+	"""
+	Price spikes: a run of at least up_or_down_times moves in one direction
+	that ends with a move in the opposite direction.
+	:param runs: the result of price_runs
+	:param up_or_down_times: minimum number of moves of a spike
+	:return: dict of numpy arrays: first_tick and last_tick (indices into the prices, the first
+	tick is the price before the run), direction, magnitude (price change) and duration (ticks)
+	"""
+	starts, ends, directions, path = runs
+	next_directions = np.concatenate((directions[1:], [0]))
+	spike = (directions != 0) & (ends - starts >= up_or_down_times) & (next_directions == -directions)
+	starts = starts[spike]
+	ends = ends[spike]
+	return {
+		"first_tick": starts - 1,
+		"last_tick": ends - 1,
+		"direction": directions[spike],
+		"magnitude": path[ends] - path[starts],
+		"duration": ends - starts}
+
+
 def find_price_spike(exchange, up_or_down_times=5, rate=0.00001):
-	all_prices = exchange.all_deal_prices
-	results = []
-	last_price = exchange.init_price
-	up_times = 0
-	down_times = 0
-	for i in range(len(all_prices)):
-		cur_price = all_prices[i]
-		if cur_price - last_price >= exchange.init_price * rate:
-			if down_times == 0:
-				up_times += 1
-			else:
-				if down_times >= up_or_down_times:
-					first_tick = i - down_times - 1
-					last_tick = i - 1
-					tick_span = {
-						"first_tick": first_tick,
-						"last_tick": last_tick,
-					}
-					results.append(tick_span)
-				down_times = 0
-				up_times = 1
-		elif last_price - cur_price > exchange.init_price * rate:
-			if up_times == 0:
-				down_times += 1
-			else:
-				if up_times >= up_or_down_times:
-					first_tick = i - up_times - 1
-					last_tick = i - 1
-					tick_span = {
-						"first_tick": first_tick,
-						"last_tick": last_tick,
-					}
-					results.append(tick_span)
-				up_times = 0
-				down_times = 1
-		else:
-			up_times = 0
-			down_times = 0
-
-		last_price = cur_price
-	print(results)
-
-
-def sample_data(data, quantity):
-	threshold = 10
-	i = 0
-	temp = []
-	result1 = []
-	result2 = []
-	while i < len(data):
-		if quantity[i] < threshold:
-			temp.append(data[i])
-		else:
-			if temp:
-				result1.append(sum(temp) / len(temp))
-			else:
-				result1.append(0)
-			result2.append(threshold)
-			threshold *= 10
-			temp = []
-		i += 1
-	if temp:
-		result1.append(sum(temp))
-		result2.append(threshold)
-	print(result1[1:], result2[1:])
-	return result1[1:], result2[1:]
-
-
-def concave_price_impact(exchange):
-	mid_quotes = exchange.mid_quotes
-	price_impacts = []
-	order_quantities = []
-	for i in range(1, len(mid_quotes)):
-		price_impact = mid_quotes[i - 1]["mid_quote"] / mid_quotes[i]["mid_quote"]
-		if price_impact == 0:
-			continue
-		price_impacts.append(math.log(price_impact))
-		order_quantities.append(mid_quotes[i]["quantity"])
-
-	# plt.plot(sample_data(price_impacts, 10))
-	price_quantity_pairs = []
-	for i in range(len(price_impacts)):
-		price_quantity_pairs.append([price_impacts[i], order_quantities[i]])
-	price_quantity_sorted = sorted(price_quantity_pairs, key=lambda d: d[1])
-	price_impacts_sorted = [e[0] for e in price_quantity_sorted]
-	quantities_sorted = [e[1] for e in price_quantity_sorted]
-	# price_impacts_sorted = pd.DataFrame.ewm(pd.Series(price_impacts_sorted), span=500).mean()
+	"""
+	Find price spikes in the deal prices, see price_spikes.
+	up_or_down_times and rate may also be lists, then every combination is computed in one call.
+	With retention on, the deal prices still in memory are searched, from the oldest one held,
+	and the ticks are indices into all deal prices.
+	:return: spans as returned by price_spikes, or a dict of them keyed by (up_or_down_times, rate)
+	"""
+	start, deal_prices = held_values(exchange.all_deal_prices)
+	init_price = exchange.init_price
+	if start > 0:
+		init_price = deal_prices[0]
+		deal_prices = deal_prices[1:]
+		start += 1
+	results = dict()
+	for cur_rate in np.atleast_1d(rate):
+		runs = price_runs(deal_prices, init_price, cur_rate)
+		for times in np.atleast_1d(up_or_down_times):
+			spikes = price_spikes(runs, times)
+			spikes["first_tick"] += start
+			spikes["last_tick"] += start
+			results[(int(times), float(cur_rate))] = spikes
+			print("up_or_down_times: {}, rate: {}, spikes: {}".format(times, cur_rate, len(spikes["first_tick"])))
+	if np.ndim(up_or_down_times) == 0 and np.ndim(rate) == 0:
+		return spikes
+	return results
+
+
+class PriceImpactBins:
+	"""
+	Mean mid-quote log impact per order-size bin, accumulated over any number of runs.
+	Only per-bin sums are kept, so runs can be added without holding their (impact, size) pairs.
+	The impact of an order is log(mid-quote before / mid-quote after).
+	"""
+
+	def __init__(self, bins=None):
+		"""
+		:param bins: increasing bin edges of order size, 25 log-spaced edges from 1 to 10^6 if None
+		"""
+		if bins is None:
+			bins = np.logspace(0, 6, 25)
+		self.bins = np.asarray(bins, dtype=np.float64)
+		# index 0 and the last index collect sizes below and above the edges
+		self.count = np.zeros(len(self.bins) + 1, dtype=np.int64)
+		self.total = np.zeros(len(self.bins) + 1)
+		self.total_square = np.zeros(len(self.bins) + 1)
+
+	def add(self, mid_quotes, quantities):
+		"""
+		:param mid_quotes: mid-quote after each order
+		:param quantities: size of each order
+		"""
+		mid_quotes = np.asarray(mid_quotes, dtype=np.float64)
+		quantities = np.asarray(quantities, dtype=np.float64)[1:]
+		with np.errstate(divide="ignore", invalid="ignore"):
+			price_impacts = np.log(mid_quotes[:-1] / mid_quotes[1:])
+		valid = np.isfinite(price_impacts)
+		price_impacts = price_impacts[valid]
+		positions = np.digitize(quantities[valid], self.bins)
+		length = len(self.count)
+		self.count += np.bincount(positions, minlength=length)
+		self.total += np.bincount(positions, weights=price_impacts, minlength=length)
+		self.total_square += np.bincount(positions, weights=price_impacts * price_impacts, minlength=length)
+
+	def add_exchange(self, exchange):
+		self.add(exchange.mid_quotes.column("mid_quote"), exchange.mid_quotes.column("quantity"))
+
+	def merge(self, other):
+		"""
+		add the bins of another PriceImpactBins with the same edges, e.g. from another process
+		"""
+		self.count += other.count
+		self.total += other.total
+		self.total_square += other.total_square
+
+	def result(self):
+		"""
+		:return: dict of numpy arrays per bin: lower and upper size edges, mean impact,
+		count and standard error of the mean (nan for bins with fewer than 2 orders)
+		"""
+		count = self.count[1:len(self.bins)]
+		total = self.total[1:len(self.bins)]
+		total_square = self.total_square[1:len(self.bins)]
+		with np.errstate(divide="ignore", invalid="ignore"):
+			mean = total / count
+			variance = np.maximum(total_square - count * mean * mean, 0) / (count - 1)
+			standard_error = np.where(count > 1, np.sqrt(variance / count), np.nan)
+		return {
+			"lower": self.bins[:-1],
+			"upper": self.bins[1:],
+			"mean": mean,
+			"count": count,
+			"standard_error": standard_error}
+
+
+def concave_price_impact(exchange, bins=None, price_impact_bins=None):
+	"""
+	Plot the mean price impact against order size, on log-spaced size bins.
+	:param bins: bin edges, see PriceImpactBins
+	:param price_impact_bins: PriceImpactBins to accumulate this run into, e.g. over several runs
+	:return: the PriceImpactBins holding this run
+	"""
+	if price_impact_bins is None:
+		price_impact_bins = PriceImpactBins(bins)
+	price_impact_bins.add_exchange(exchange)
+	result = price_impact_bins.result()
+	filled = result["count"] > 0
+	centers = np.sqrt(result["lower"] * result["upper"])
 	plt.figure(figsize=(8, 4))
-	result1, result2 = sample_data(price_impacts_sorted, quantities_sorted)
-	plt.plot(result2, result1)
+	plt.errorbar(centers[filled], result["mean"][filled], yerr=result["standard_error"][filled])
+	plt.xscale("log")
 	plt.xlabel("Trade size")
 	plt.ylabel("Price impact")
 	plt.savefig("figures/concave price impact {}.png".format(uuid.uuid4()), dpi=400, bbox_inches="tight")
 	plt.show()
+	return price_impact_bins
+
+
+def returns_kurtosis(returns, time_scale):
+	return kurtosis(returns)
+
+
+def returns_volatility_clustering(returns, time_scale):
+	"""
+	% volatility clustering of returns: scaled log of the lag-1 auto-correlation of absolute returns
+	"""
+	acfs = auto_correlation(np.abs(returns), 1)
+	h = math.log(acfs[-1], 5)
+	return abs(h) * 100
+
+
+def returns_auto_correlation(returns, time_scale, lags=10):
+	return auto_correlation(returns, lags)
 
 
-def volatility_clustering(exchange):
-	mid_prices = exchange.mid_quotes
+def volatility_clustering(exchange, processes=None):
+	mid_prices = exchange.mid_quotes.column("mid_quote")
 	time_scales = list(range(1, 2000, 10))
-	hursts = []
-	for time_scale in time_scales:
-		mid_price_returns = []
-		for i in range(len(mid_prices) - time_scale):
-			mid_price_return = math.log(mid_prices[i + time_scale]["mid_quote"] / mid_prices[i]["mid_quote"])
-			mid_price_returns.append(abs(mid_price_return))
-		y = []
-		cur_total_price = 0
-		for price in mid_price_returns:
-			cur_total_price += price
-			y.append(price)
-		acfs = auto_correlation(y, 1)
-		h = math.log(acfs[-1], 5)
-		hursts.append(abs(h) * 100)
+	hursts = multi_scale.map_scales(returns_volatility_clustering, mid_prices, time_scales, processes)
 	plt.plot(time_scales, hursts)
 	plt.xlabel("Time-scale")
 	plt.ylabel("% Volatility clustering")
@@ -205,20 +345,14 @@ def volatility_clustering(exchange):
 	plt.show()
 
 
-def fat_tailed_distribution(exchange):
-	mid_prices = exchange.mid_prices
+def fat_tailed_distribution(exchange, processes=None):
+	start, mid_prices = held_values(exchange.mid_prices)
 	time_scales = list(range(500, 50000, 500))
-	kurtosis_multi_scales = []
-	for time_scale in time_scales:
-		mid_quote_returns = []
-		for i in range(len(mid_prices) - time_scale):
-			mid_quote_return = math.log(mid_prices[i + time_scale] / mid_prices[i])
-			mid_quote_returns.append(mid_quote_return)
-		kurt = kurtosis(mid_quote_returns)
-		kurtosis_multi_scales.append(kurt)
+	kurtosis_multi_scales = multi_scale.map_scales(returns_kurtosis, mid_prices, time_scales, processes)
 	plt.figure(figsize=(8, 4))
 	# plt.plot(mid_prices)
-	mid_price_rolling_mean = pd.DataFrame.ewm(pd.Series(mid_prices), span=2000).mean()
+	mid_price_series = pd.Series(mid_prices, index=range(start, start + len(mid_prices)))
+	mid_price_rolling_mean = pd.DataFrame.ewm(mid_price_series, span=2000).mean()
 	plt.plot(mid_price_rolling_mean)
 	plt.xlabel("Period")
 	plt.ylabel("Mid-price")
@@ -233,15 +367,10 @@ def fat_tailed_distribution(exchange):
 	plt.show()
 
 
-def return_auto_correlation(exchange):
-	mid_prices = exchange.mid_prices
+def return_auto_correlation(exchange, processes=None):
+	start, mid_prices = held_values(exchange.mid_prices)
 	time_scales = list(range(1, 10))
-	for time_scale in time_scales:
-		mid_price_returns = []
-		for i in range(len(mid_prices) - time_scale):
-			mid_price_return = math.log(mid_prices[i + time_scale] / mid_prices[i])
-			mid_price_returns.append(mid_price_return)
-		acfs = auto_correlation(mid_price_returns, 10)
+	for acfs in multi_scale.map_scales(returns_auto_correlation, mid_prices, time_scales, processes):
 		print(acfs)
 	# plt.plot(time_scales, hursts)
 	# plt.xlabel("Time-scale")
@@ -250,16 +379,8 @@ def return_auto_correlation(exchange):
 	# plt.show()
 
 	print()
-	trade_prices = exchange.prices
+	start, trade_prices = held_values(exchange.prices)
 	trade_prices = pd.DataFrame.ewm(pd.Series(trade_prices), span=4).mean()
 
-	acf_multi_scales = []
-	for time_scale in time_scales:
-		trade_price_returns = []
-		for i in range(len(trade_prices) - time_scale):
-			mid_quote_return = math.log(trade_prices[i + time_scale]) - math.log(trade_prices[i])
-			trade_price_returns.append(mid_quote_return)
-		acfs = auto_correlation(trade_price_returns, 10)
+	for acfs in multi_scale.map_scales(returns_auto_correlation, trade_prices, time_scales, processes):
 		print(acfs)
-	#
-	# print("acf on different scales: {}".format(acf_multi_scales))
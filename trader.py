@@ -1,4 +1,5 @@
 from order import Order
+from random_stream import RandomStream
 
 
 class Trader:
@@ -6,13 +7,76 @@ class Trader:
 	The super Class of all agent Classes.
 	Define the basic methods of a Trader Class, like buy, sell.
 	"""
-	def __init__(self):
+	def __init__(self, seed=None):
+		"""
+		:param seed: seed of the random stream of this trader, see RandomStream
+		"""
 		# trader ID code
 		self.trader_id = ""
 		# record of trades executed
 		self.blotter = []
 		# wealth
 		self.wealth = 0
+		# the only source of randomness of the trader
+		self.stream = RandomStream(seed)
+
+	@property
+	def activation_prob(self):
+		"""
+		probability that the trader acts in a period, see Scheduler
+		"""
+		return 1.0
+
+	def first_activation(self, start_time):
+		"""
+		:return: the first period from start_time in which the trader acts, or None if it never does
+		"""
+		gap = self.stream.geometric(self.activation_prob)
+		if gap is None:
+			return None
+		return start_time + gap - 1
+
+	def next_activation(self, cur_time):
+		"""
+		:return: the next period after cur_time in which the trader acts, or None if it never does
+		"""
+		gap = self.stream.geometric(self.activation_prob)
+		if gap is None:
+			return None
+		return cur_time + gap
+
+	def open_session(self, session, start_time):
+		"""
+		Start a session, a trading day; the trader's daily state is reset here,
+		state which follows the prices across days, like moving averages, is kept
+		:param session: number of the session
+		:param start_time: first period of the session
+		"""
+		self.blotter = []
+
+	def close_session(self, session, end_time):
+		"""
+		End a session
+		:param session: number of the session
+		:param end_time: period after the last one of the session
+		"""
+		return None
+
+	@property
+	def members(self):
+		"""
+		traders which trade under this agent, see population.Population
+		"""
+		return [self]
+
+	def act(self, exchange, cur_time):
+		"""
+		The logic of the trader in a period it is activated in
+		:param exchange: the instance of Exchange Class
+		:param cur_time: current time
+		:return: the order to be submitted, or None
+		"""
+		return None
 
 	def buy(self, bid_price, quantity, cur_time):
 		if bid_price is None or bid_price == 0 or quantity is None or quantity == 0:
@@ -5,6 +5,7 @@ import matplotlib.pyplot as plt
 import uuid
 import numpy as np
 import math
+from ring_series import held_values
 
 
 def create_log(file_name):
@@ -57,7 +58,10 @@ def sample_data(data, times, number):
 
 def plot_price_trend(exchange):
 	print("all prices: {}".format(len(exchange.prices)))
-	trade_price_rolling_mean = pd.DataFrame.ewm(pd.Series(exchange.prices), span=2000).mean()
+	# with retention on, only the latest prices are in memory and are plotted at their periods
+	start, prices = held_values(exchange.prices)
+	prices = pd.Series(prices, index=range(start, start + len(prices)))
+	trade_price_rolling_mean = pd.DataFrame.ewm(prices, span=2000).mean()
 	plt.figure(figsize=(8, 4))
 	# plt.plot(exchange.prices)
 	plt.plot(trade_price_rolling_mean)
@@ -85,29 +89,34 @@ def plot_order_scatter(agent_order):
 	plt.show()
 
 
+def trade_columns(exchange):
+	"""
+	NumPy views of the trades on the tape, trader ids are codes of exchange.interner
+	"""
+	tape = exchange.tape
+	is_trade = tape.column("type") == exchange.interner.codes.get("Trade", -1)
+	trades = dict()
+	for name in ["time", "price", "quantity", "bid", "ask"]:
+		trades[name] = tape.column(name)[is_trade]
+	return trades
+
+
 def plot_order_proportion(exchange):
-	all_trade_record = exchange.tape
-	total_quantity = 0
-	mm_quantity = 0
-	lc_quantity = 0
-	mr_quantity = 0
-	mt_quantity = 0
-	nt_quantity = 0
-	lc_last = 0
-	for trade in all_trade_record:
-		if trade["type"] == "Trade":
-			total_quantity += trade["quantity"]
-			if trade["ask"] == "market maker" or trade["bid"] == "market maker":
-				mm_quantity += trade["quantity"]
-			if trade["ask"] == "liquidity consumer" or trade["bid"] == "liquidity consumer":
-				lc_quantity += trade["quantity"]
-				lc_last = trade["time"]
-			if trade["ask"] == "mean reversion trader" or trade["bid"] == "mean reversion trader":
-				mr_quantity += trade["quantity"]
-			if trade["ask"] == "momentum trader" or trade["bid"] == "momentum trader":
-				mt_quantity += trade["quantity"]
-			if trade["ask"] == "noise trader" or trade["bid"] == "noise trader":
-				nt_quantity += trade["quantity"]
+	trades = trade_columns(exchange)
+	quantities = trades["quantity"]
+
+	def traded_by(trader_id):
+		code = exchange.interner.codes.get(trader_id, -1)
+		return (trades["ask"] == code) | (trades["bid"] == code)
+
+	total_quantity = int(quantities.sum())
+	mm_quantity = int(quantities[traded_by("market maker")].sum())
+	lc_traded = traded_by("liquidity consumer")
+	lc_quantity = int(quantities[lc_traded].sum())
+	lc_last = int(trades["time"][lc_traded][-1]) if lc_traded.any() else 0
+	mr_quantity = int(quantities[traded_by("mean reversion trader")].sum())
+	mt_quantity = int(quantities[traded_by("momentum trader")].sum())
+	nt_quantity = int(quantities[traded_by("noise trader")].sum())
 
 	# for trade in all_trade_record:
 	# 	if trade["type"] == "Trade":
@@ -145,11 +154,7 @@ def plot_order_proportion(exchange):
 
 
 def plot_order_hist(exchange):
-	all_trade_record = exchange.tape
-	quantities = []
-	for trade in all_trade_record:
-		if trade["type"] == "Trade":
-			quantities.append(trade["price"])
+	quantities = trade_columns(exchange)["price"]
 	import scipy
 	mu = np.mean(quantities)
 	sigma = np.std(quantities)